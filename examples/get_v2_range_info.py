@@ -11,4 +11,5 @@ from gapproduction import ranges
 df = ranges.V2ForRangeEdit("C:/Workspaces/RangeMaps/marten/mAMMAx2016.sqlite")
 
 # From here you could insert the dataframe into the tblRangeEdit table in the
-# GAP database.
\ No newline at end of file
+# GAP database.
+# ranges.LoadtblRangeEdit(df, "GapVert_48_2016")
\ No newline at end of file
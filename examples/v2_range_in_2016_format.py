@@ -18,4 +18,5 @@ df = ranges.V2As2016("K:/ ENTER A PATH /mAMMAx2016.sqlite")
 # Write the dataframe to a csv file
 df.to_csv("L:/mAMMAx2016.csv", index=False)
 
-# Instead of writing to a csv, you could write to the database (insert into)
\ No newline at end of file
+# Instead of writing to a csv, you could write to the database (insert into)
+# ranges.LoadtblRanges(df, "GapVert_48_2016")
\ No newline at end of file
@@ -1,4 +1,4 @@
-from gapproduction import database, dictionaries, documents, strings, taxonomy, citations, ranges, habitat
+from gapproduction import database, dictionaries, documents, strings, taxonomy, citations, ranges, habitat, search
 
 all = ['database', 'dictionaries', 'documents', 'strings', 'taxonomy',
-       'citations', 'ranges', 'habitat']
+       'citations', 'ranges', 'habitat', 'search']
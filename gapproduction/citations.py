@@ -8,41 +8,50 @@ pd.options.display.max_colwidth = 1000
 import re
 
 # Function to check if a reference already exists -----------------------------
-def CitationExists(citation : str, db : str) -> (bool, pd.DataFrame):
+def CitationExists(citation : str, db : str, 
+                   index : dict = None) -> (bool, pd.DataFrame):
     '''
     Looks for a citation in the database.  Matches would unlikely be exact, so
     the function uses wildcards to match the citation to the database and 
-    prints protential matches.
+    prints protential matches.  If an index from BuildCitationIndex is 
+    provided, it is searched with MatchCitations instead of the database,
+    which catches differently formatted duplicates and makes no queries.
 
     Parameters
     ----------
     citation : A string containing the reference information.
     db : A string containing the name of the database to query.
+    index : An optional index returned by BuildCitationIndex.
 
     Returns
     -------
     exists : A boolean indicating whether the citation already exists.
     matches : A dataframe of potential matches.
     '''
-    # Connect to database
-    cursor, connection = database.ConnectDB(db)
-
     print("Your reference: \n" + citation + "\n")
-    # Use regex to find the year in the reference
-    full_year = re.findall(r'\d{4}', citation)[0]
-    YY = full_year[-2:]
 
-    # Get the first 3 characters of the reference
-    auth = citation[:3]
+    if index is not None:
+        matches = MatchCitations([citation], index).drop(columns='reference')
+
+    else:
+        # Connect to database
+        cursor, connection = database.ConnectDB(db)
+
+        # Use regex to find the year in the reference
+        full_year = re.findall(r'\d{4}', citation)[0]
+        YY = full_year[-2:]
+
+        # Get the first 3 characters of the reference
+        auth = citation[:3]
 
-    # Build a wildcard string to find potential matches knowning that similar
-    # citations would start with auth and contain YY followed by a period.
-    wc = auth + '%' + full_year + '%'
+        # Build a wildcard string to find potential matches knowning that similar
+        # citations would start with auth and contain YY followed by a period.
+        wc = auth + '%' + full_year + '%'
 
-    # Query the database for similar citations
-    sql = """SELECT * FROM dbo.tblCitations WHERE memCitation LIKE ?
-                                            ;"""
-    matches = pd.read_sql(sql, connection, params=[wc,])
+        # Query the database for similar citations
+        sql = """SELECT * FROM dbo.tblCitations WHERE memCitation LIKE ?
+                                                ;"""
+        matches = pd.read_sql(sql, connection, params=[wc,])
 
     # If there are no matches, the citation is new
     if matches.empty:
@@ -52,9 +61,154 @@ def CitationExists(citation : str, db : str) -> (bool, pd.DataFrame):
     else:
         exists = True
         print("The reference provided may already be in the database.  The following matched:")
-        print(matches)
+        print(matches[['strRefCode', 'memCitation']])
         return exists, matches
     
+# Words that are ignored when comparing citations -----------------------------
+__stopWords = {'an', 'as', 'at', 'by', 'in', 'is', 'of', 'on', 'or', 'to',
+               'the', 'and', 'for', 'from', 'with', 'into', 'its', 'that',
+               'this', 'are', 'was', 'were', 'not', 'but', 'pp', 'vol',
+               'des', 'del', 'der', 'und', 'les'}
+
+# Function to parse a citation into normalized parts --------------------------
+def ParseCitation(citation : str) -> dict:
+    '''
+    Parses a citation into a normalized first author's last name, year, and
+    sets of title and text tokens, for matching citations that are not
+    formatted identically.  Accents are removed and everything is lowercase.
+
+    Parameters
+    ----------
+    citation : A string containing the reference information.
+
+    Returns
+    -------
+    parsed : A dictionary with keys "author" (str), "year" (str or None),
+        "title" (set of words after the year), and "tokens" (set of all
+        words).
+
+    Example:
+    >>> p = ParseCitation("Fake, H. C. 1914. This is a TEST. Auk 31: 168-177.")
+    >>> p['author'], p['year'], sorted(p['title'])
+    ('fake', '1914', ['168', '177', '31', 'auk', 'test'])
+    '''
+    import unicodedata
+
+    text = unicodedata.normalize('NFKD', str(citation))
+    text = text.encode('ascii', 'ignore').decode('ascii').lower()
+
+    # First author's last name is the first word
+    author = re.match(r'\W*([a-z\'\-]*)', text).group(1).replace("'", '')
+
+    # Year is the first four-digit year
+    year = re.search(r'\b(1[5-9]\d\d|20\d\d)\b', text)
+
+    # Words are runs of letters and digits that aren't stop words
+    def __words(t):
+        return set([w for w in re.findall(r'[a-z0-9]+', t)
+                    if len(w) > 1 and w not in __stopWords])
+
+    return {'author': author,
+            'year': year.group(1) if year else None,
+            'title': __words(text[year.end():]) if year else __words(text),
+            'tokens': __words(text)}
+
+
+# Function to build an index of the citations in a database -------------------
+def BuildCitationIndex(db : str) -> dict:
+    '''
+    Reads every citation in tblCitations once, parses it with ParseCitation,
+    and builds an in-memory index for matching new references against the
+    database with MatchCitations.
+
+    Parameters
+    ----------
+    db : A string containing the name of the database to query.
+
+    Returns
+    -------
+    index : A dictionary with keys "citations" (a dataframe of strRefCode,
+        memCitation, and the parsed parts), "blocks" (row numbers by
+        (year, author)), and "tokens" (an inverted index of row numbers by
+        title word).
+    '''
+    # Connect to database
+    cursor, connection = database.ConnectDB(db)
+    sql = """SELECT strRefCode, memCitation FROM dbo.tblCitations
+             WHERE memCitation IS NOT NULL;"""
+    citations = pd.read_sql(sql, connection)
+    cursor.close()
+    connection.close()
+
+    # Leave out codes reserved by AllocateStrRefCodes
+    citations = citations[citations['memCitation'] != __reservedCitation]
+    citations = citations.reset_index(drop=True)
+
+    # Parse the citations
+    parsed = pd.DataFrame([ParseCitation(x) for x in citations['memCitation']],
+                          columns=['author', 'year', 'title', 'tokens'])
+    citations = pd.concat([citations, parsed], axis=1)
+
+    # Index them by year and author, and by title word
+    blocks, tokens = {}, {}
+    for i, row in enumerate(citations.itertuples(index=False)):
+        blocks.setdefault((row.year, row.author), []).append(i)
+        for token in row.title:
+            tokens.setdefault(token, set()).add(i)
+
+    return {'citations': citations, 'blocks': blocks, 'tokens': tokens}
+
+
+# Function to find near-duplicates of references ------------------------------
+def MatchCitations(references : list, index : dict, threshold : float = 0.5,
+                   limit : int = 5) -> pd.DataFrame:
+    '''
+    Finds citations in an index from BuildCitationIndex that are likely
+    duplicates of each of a list of references.  Candidates are the
+    citations with the same year and first author; if there are none (e.g.,
+    the year is missing), candidates are those sharing title words.
+    Candidates are scored by the Jaccard similarity of their words.
+
+    Parameters
+    ----------
+    references : A list of strings containing reference information.
+    index : An index returned by BuildCitationIndex.
+    threshold : The minimum similarity score (0 to 1).  Default is 0.5.
+    limit : The maximum number of matches per reference.  Default is 5.
+
+    Returns
+    -------
+    matches : A dataframe with columns "reference", "strRefCode",
+        "memCitation", and "score", best matches first for each reference.
+    '''
+    citations = index['citations']
+    tokens = citations['tokens'].values
+
+    rows = []
+    for reference in references:
+        parsed = ParseCitation(reference)
+
+        # Gather candidates from the year-author block, or by title word
+        candidates = index['blocks'].get((parsed['year'], parsed['author']))
+        if not candidates:
+            candidates = set().union(*[index['tokens'].get(x, set())
+                                       for x in parsed['title']])
+
+        # Score them
+        scores = []
+        for i in candidates:
+            union = len(parsed['tokens'] | tokens[i])
+            score = len(parsed['tokens'] & tokens[i]) / union if union else 0
+            if score >= threshold:
+                scores.append((score, i))
+
+        for score, i in sorted(scores, reverse=True)[:limit]:
+            rows.append([reference, citations.at[i, 'strRefCode'],
+                         citations.at[i, 'memCitation'], score])
+
+    return pd.DataFrame(rows, columns=['reference', 'strRefCode',
+                                       'memCitation', 'score'])
+
 # Function to check if a reference code is available --------------------------
 def Availability(reference_code : str, db : str) -> bool:
     '''
@@ -91,6 +245,88 @@ def Availability(reference_code : str, db : str) -> bool:
         print(matches)
         return free
 
+# Placeholder citation text for reserved reference codes ----------------------
+__reservedCitation = 'RESERVED: reference code allocated by AllocateStrRefCodes'
+
+# Functions to work out free reference code sequence numbers ------------------
+def __RefCodePrefix(reference : str, reference_type : str) -> str:
+    '''
+    Returns the X YY ZZZ part of a reference code: the reference type, the
+    last two digits of the year, and the first 3 characters of the primary
+    author's last name.
+    '''
+    # Get the author characters
+    ZZZ = reference.split()[0][:3].upper()
+
+    # Use regex to find the year in the reference
+    YY = re.findall(r'\d{4}', reference)[0][-2:]
+
+    return reference_type + YY + ZZZ
+
+def __UsedSequences(prefixes, connection) -> dict:
+    '''
+    Returns the sets of sequence numbers in use for each of a list of code
+    prefixes (X YY ZZZ), with one query.
+    '''
+    prefixes = list(prefixes)
+    sql = """SELECT strRefCode FROM dbo.tblCitations
+             WHERE LEFT(strRefCode, 6) IN ({markers});"""
+    codes = database.ReadSQLIn(sql, prefixes, connection)['strRefCode']
+
+    used = {x: set() for x in prefixes}
+    for code in codes:
+        if code[:6] in used and code[6:8].isdigit():
+            used[code[:6]].add(int(code[6:8]))
+    return used
+
+def __FreeSequences(prefix : str, used : set, n : int) -> list:
+    '''
+    Returns the first n free two-digit sequence numbers for a code prefix.
+    '''
+    free = ['%02d' % x for x in range(1, 100) if x not in used][:n]
+    if len(free) < n:
+        raise ValueError(f"Not enough free sequence numbers for {prefix}")
+    return free
+
+def __AllocateCodes(prefixes : list, cursor, connection, 
+                    lock : bool = True) -> list:
+    '''
+    Returns a free reference code for each of a list of code prefixes, with
+    one query.  Repeated prefixes get consecutive sequence numbers.  If lock
+    is True, it first begins a transaction on the pyodbc connection and
+    takes an exclusive application lock until it ends (raising an error if
+    the lock isn't granted).
+    '''
+    source = 'USGP'
+
+    # Start a transaction and lock allocation until it ends, failing if the
+    # lock isn't granted
+    if lock:
+        cursor.execute("""SET NOCOUNT ON;
+                          BEGIN TRANSACTION;
+                          DECLARE @result int;
+                          EXEC @result = sp_getapplock 
+                                         @Resource = 'tblCitations.strRefCode',
+                                         @LockMode = 'Exclusive',
+                                         @LockOwner = 'Transaction';
+                          IF @result < 0
+                              THROW 50000, 'strRefCode lock not acquired', 1;""")
+
+    # Get the sequence numbers in use and allocate free ones
+    used = __UsedSequences(set(prefixes), connection)
+    free = {x: iter(__FreeSequences(x, used[x], prefixes.count(x)))
+            for x in set(prefixes)}
+    return [x + next(free[x]) + source for x in prefixes]
+
+def __CommitCodes(cursor, connection) -> None:
+    '''
+    Commits the transaction begun by __AllocateCodes, which releases the
+    lock.  The explicit transaction may be nested in the driver's implicit
+    one, so every open level is committed.
+    '''
+    cursor.execute("WHILE @@TRANCOUNT > 0 COMMIT TRANSACTION;")
+    connection.commit()
+
 # Function to make a reference code -------------------------------------------
 def BuildStrRefCode(reference : str, reference_type : str,
                      db : str) -> str:
@@ -129,69 +365,120 @@ def BuildStrRefCode(reference : str, reference_type : str,
     reference_code : A string containing the reference code.
 
     '''
-    # Local function to increment the sequence number into a new code
-    def __seq(reference_code):
-        '''
-        Changes a reference code by incrementing the sequence number.
-        '''
-        # Get the current sequence number
-        seq = reference_code[6:8]
+    source = 'USGP'
 
-        # Increment the sequence number
-        seq = str(int(seq) + 1)
+    # Identify the X YY ZZZ part of the code
+    prefix = __RefCodePrefix(reference, reference_type)
 
-        # Pad the sequence number with a leading zero if needed
-        if len(seq) == 1:
-            seq = '0' + seq
+    # Get the sequence numbers already in use with one query
+    cursor, connection = database.ConnectDB(db)
+    used = __UsedSequences([prefix], connection)[prefix]
+    cursor.close()
+    connection.close()
 
-        # Replace the sequence number in the reference code
-        reference_code = reference_code[:6] + seq + reference_code[8:]
-        return reference_code  
+    # Use the first free sequence number
+    reference_code = prefix + __FreeSequences(prefix, used, 1)[0] + source
 
-    seq = '01'
-    source = 'USGP'
+    if reference_code[6:8] != '01':
+        print("Reference code was taken, changed to " + reference_code)
+    return reference_code
 
-    # Get the author characters
-    ZZZ = reference.split()[0][:3].upper()
+# Function to allocate many reference codes at once ---------------------------
+def AllocateStrRefCodes(references : list, reference_type, db : str,
+                        reserve : bool = True) -> list:
+    '''
+    Builds reference codes (see BuildStrRefCode) for many references at
+    once.  Codes in use are read with one query, and references with the
+    same type, year, and author get consecutive sequence numbers.
 
-    # Use regex to find the year in the reference
-    YY = re.findall(r'\d{4}', reference)[0][-2:]
+    If reserve is True, the allocation runs under an exclusive application
+    lock and each code is reserved by inserting a placeholder row into
+    tblCitations, so that parallel users cannot be given the same codes.
+    AddReference fills in a reserved row, and ReleaseStrRefCodes removes
+    reservations that won't be used.
 
-    # Identify what a new code would be
-    reference_code = reference_type + YY + ZZZ + seq + source
+    Parameters
+    ----------
+    references : A list of strings containing reference information.
+    reference_type : A reference type letter (see BuildStrRefCode), or a 
+        list of them, one per reference.
+    db : A string containing the name of the database to query.
+    reserve : Whether to reserve the codes in the database.  Default is True.
 
-    # See if the code is available
-    free = Availability(reference_code, db)
+    Returns
+    -------
+    reference_codes : A list of reference codes, one per reference.
+    '''
+    if isinstance(reference_type, str):
+        reference_type = [reference_type] * len(references)
+    prefixes = [__RefCodePrefix(x, y) for x, y in zip(references, 
+                                                        reference_type)]
 
-    # If free, return code
-    if free:
-        return reference_code
+    # Connect to database
+    cursor, connection = database.ConnectDB_pyodbc(db)
+
+    try:
+        # Allocate the codes
+        reference_codes = __AllocateCodes(prefixes, cursor, connection, 
+                                          lock=reserve)
+
+        # Reserve the codes
+        if reserve:
+            database.BulkInsert(cursor, "dbo.tblCitations",
+                                pd.DataFrame({"strRefCode": reference_codes,
+                                              "memCitation": __reservedCitation}),
+                                commit=False)
+        __CommitCodes(cursor, connection)
+
+    except Exception as e:
+        connection.rollback()
+        print(e)
+        raise
+
+    finally:
+        cursor.close()
+        connection.close()
+
+    return reference_codes
+
+# Function to release reserved reference codes --------------------------------
+def ReleaseStrRefCodes(reference_codes : list, db : str) -> int:
+    '''
+    Deletes reservations made by AllocateStrRefCodes that were not filled by
+    AddReference, so the codes can be allocated again.
 
-    if not free:
-        # Use a while statement to increment the sequence number until a free
-        #   code is found
-        i = 0
-        while not free:
-            # Increment the sequence number
-            reference_code = __seq(reference_code)
+    Parameters
+    ----------
+    reference_codes : A list of reserved reference codes.
+    db : A string containing the name of the database to query.
 
-            # Check if the code is free
-            free = Availability(reference_code, db)
+    Returns
+    -------
+    count : The number of reservations deleted.
+    '''
+    # Connect to database
+    cursor, connection = database.ConnectDB_pyodbc(db)
 
-            # Break if too many iterations
-            i += 1
-            if i > 99:
-                print("Too many iterations")
-                break
+    count = 0
+    for start in range(0, len(reference_codes), 1000):
+        chunk = list(reference_codes[start:start + 1000])
+        cursor.execute(f"""DELETE FROM dbo.tblCitations 
+                           WHERE memCitation = ? 
+                           AND strRefCode IN ({', '.join(['?'] * len(chunk))});""",
+                       [__reservedCitation] + chunk)
+        count += cursor.rowcount
+    connection.commit()
 
-    # Return the free code
-    print("Reference code was taken, changed to " + reference_code)
-    return reference_code
+    cursor.close()
+    connection.close()
+
+    return count
 
 # Function to add a reference to the database ---------------------------------
 def AddReference(reference : str, reference_code : str, db : str) -> None:
     '''
-    Add a reference to the database if the reference code doesn't exit.
+    Add a reference to the database if the reference code doesn't exit, or
+    fill in the code's reservation if it was reserved by AllocateStrRefCodes.
 
     Parameters
     ----------
@@ -204,18 +491,34 @@ def AddReference(reference : str, reference_code : str, db : str) -> None:
     None
     '''
     # Connect to database
-    cursor, connection = database.ConnectDB(db)
+    cursor, connection = database.ConnectDB_pyodbc(db)
 
-    # SQL to add if not exists
-    sql = """INSERT INTO dbo.tblCitations (strRefCode, memCitation)
-             SELECT ?, ? WHERE NOT EXISTS 
-                    (SELECT * FROM dbo.tblCitations WHERE strRefCode = ?);"""
+    try:
+        # SQL to fill in the code's reservation, if it was reserved by 
+        # AllocateStrRefCodes
+        sql = """UPDATE dbo.tblCitations SET memCitation = ?
+                 WHERE strRefCode = ? AND memCitation = ?;"""
+        cursor.execute(sql, reference, reference_code, __reservedCitation)
 
-    # Execute the query
-    connection.execute(sql, reference_code, reference, reference_code)
+        # SQL to add if not exists
+        sql = """INSERT INTO dbo.tblCitations (strRefCode, memCitation)
+                 SELECT ?, ? WHERE NOT EXISTS 
+                        (SELECT * FROM dbo.tblCitations WHERE strRefCode = ?);"""
 
-    # Commit the changes
-    #connection.commit()
+        # Execute the query
+        cursor.execute(sql, reference_code, reference, reference_code)
+
+        # Commit the changes
+        connection.commit()
+
+    except Exception as e:
+        connection.rollback()
+        print(e)
+        raise
+
+    finally:
+        cursor.close()
+        connection.close()
 
     # Print a message
     print(f"{reference_code} added to database: \n" + reference)
@@ -223,6 +526,378 @@ def AddReference(reference : str, reference_code : str, db : str) -> None:
     return None 
 
 
+# Reference type letters (see BuildStrRefCode) for BibTeX and RIS entry types -
+__bibtexTypes = {'article': 'A', 'book': 'B', 'inbook': 'B', 
+                 'incollection': 'B', 'phdthesis': 'N', 'mastersthesis': 'N',
+                 'techreport': 'R', 'manual': 'O', 'online': 'W', 
+                 'misc': 'U', 'unpublished': 'N'}
+__risTypes = {'JOUR': 'A', 'JFULL': 'A', 'BOOK': 'B', 'CHAP': 'B', 
+              'THES': 'N', 'RPRT': 'R', 'GOVDOC': 'O', 'STAT': 'O',
+              'PCOMM': 'P', 'ELEC': 'W', 'WEB': 'W', 'GEN': 'U'}
+
+def __FormatCitation(authors : list, year : str, title : str, 
+                     source : str) -> str:
+    '''
+    Formats the parts of a reference like the citations in tblCitations,
+    e.g., "Fake, H. C., and A. Other. 1914. Title. Auk 31: 168-177."
+    '''
+    # First author is "Last, First", the rest are "First Last"
+    names = []
+    for i, author in enumerate(authors):
+        last, _, first = [x.strip() for x in author.partition(',')]
+        if i == 0:
+            names.append(f"{last}, {first}" if first else last)
+        else:
+            names.append(f"{first} {last}" if first else last)
+    if len(names) > 1:
+        names[-1] = "and " + names[-1]
+
+    parts = [", ".join(names), year, title, source]
+    return " ".join([x.strip().rstrip('.') + '.' for x in parts if x and x.strip()])
+
+def __ReadBibTeX(text : str) -> pd.DataFrame:
+    '''
+    Reads the entries of a BibTeX file into references and reference types.
+    '''
+    rows = []
+    for match in re.finditer(r'@(\w+)\s*\{', text):
+        entry_type = match.group(1).lower()
+        if entry_type in ('comment', 'preamble', 'string'):
+            continue
+
+        # Find the end of the entry by matching braces
+        depth, end = 1, match.end()
+        while depth and end < len(text):
+            depth += {'{': 1, '}': -1}.get(text[end], 0)
+            end += 1
+        body = text[match.end():end - 1]
+
+        # Read the fields, which are in braces, quotes, or bare
+        fields = {}
+        for field in re.finditer(r'(\w+)\s*=\s*', body):
+            start = field.end()
+            if start < len(body) and body[start] == '{':
+                depth, stop = 1, start + 1
+                while depth and stop < len(body):
+                    depth += {'{': 1, '}': -1}.get(body[stop], 0)
+                    stop += 1
+                value = body[start + 1:stop - 1]
+            elif start < len(body) and body[start] == '"':
+                stop = body.find('"', start + 1)
+                value = body[start + 1:stop]
+            else:
+                value = re.match(r'[^,]*', body[start:]).group(0)
+            value = value.replace('{', '').replace('}', '')
+            fields.setdefault(field.group(1).lower(), 
+                              re.sub(r'\s+', ' ', value).strip())
+
+        authors = fields.get('author', fields.get('editor', ''))
+        authors = [x for x in re.split(r'\s+and\s+', authors) if x]
+        # Names may be "First Last" rather than "Last, First"
+        authors = [x if ',' in x else ', '.join(x.rsplit(' ', 1)[::-1]) 
+                   for x in authors]
+        source = fields.get('journal', fields.get('booktitle', 
+                 fields.get('publisher', fields.get('institution', 
+                 fields.get('school', fields.get('url', ''))))))
+        if fields.get('volume'):
+            source += f" {fields['volume']}"
+        if fields.get('pages'):
+            source += f": {fields['pages'].replace('--', '-')}"
+        rows.append([__FormatCitation(authors, fields.get('year', ''),
+                                      fields.get('title', ''), source),
+                     __bibtexTypes.get(entry_type, 'U')])
+
+    return pd.DataFrame(rows, columns=['reference', 'reference_type'])
+
+def __ReadRIS(text : str) -> pd.DataFrame:
+    '''
+    Reads the records of a RIS file into references and reference types.
+    '''
+    rows, fields = [], {}
+    for line in text.splitlines():
+        match = re.match(r'([A-Z][A-Z0-9])  -\s?(.*)', line)
+        if not match:
+            continue
+        tag, value = match.group(1), match.group(2).strip()
+        if tag == 'ER':
+            authors = fields.get('AU', []) + fields.get('A1', [])
+            year = (fields.get('PY', fields.get('Y1', fields.get('DA', ['']))))[0]
+            title = (fields.get('TI', fields.get('T1', [''])))[0]
+            source = (fields.get('JO', fields.get('T2', fields.get('JF', 
+                      fields.get('PB', fields.get('UR', [''])))))[0])
+            if fields.get('VL'):
+                source += f" {fields['VL'][0]}"
+            if fields.get('SP'):
+                source += f": {fields['SP'][0]}"
+                if fields.get('EP'):
+                    source += f"-{fields['EP'][0]}"
+            rows.append([__FormatCitation(authors, year[:4], title, source),
+                         __risTypes.get(fields.get('TY', [''])[0], 'U')])
+            fields = {}
+        else:
+            fields.setdefault(tag, []).append(value)
+
+    return pd.DataFrame(rows, columns=['reference', 'reference_type'])
+
+# Function to read references from a file -------------------------------------
+def ReadCitationFile(path : str, file_format : str = None) -> pd.DataFrame:
+    '''
+    Reads references from a BibTeX, RIS, or CSV file into citations
+    formatted like those in tblCitations, with their reference type letters
+    (see BuildStrRefCode).
+
+    A CSV file must have a "reference" (or "memCitation") column with the
+    full citation, and may have a "reference_type" column; types default to
+    "U" (unknown).
+
+    Parameters
+    ----------
+    path : The path of the file.
+    file_format : "bibtex", "ris", or "csv".  Default is to use the file's
+        extension (.bib, .ris, or .csv).
+
+    Returns
+    -------
+    references : A dataframe with columns "reference" and "reference_type".
+    '''
+    import os
+
+    if file_format is None:
+        file_format = {'.bib': 'bibtex', '.ris': 'ris', '.csv': 'csv', 
+                       '.txt': 'csv'}.get(os.path.splitext(path)[1].lower())
+    if file_format not in ('bibtex', 'ris', 'csv'):
+        raise ValueError(f"Unknown citation file format for {path}")
+
+    if file_format == 'csv':
+        references = pd.read_csv(path, dtype=str)
+        references = references.rename(columns={'memCitation': 'reference'})
+        if 'reference_type' not in references.columns:
+            references['reference_type'] = 'U'
+        references = references[['reference', 'reference_type']]
+        references = references.dropna(subset=['reference'])
+        return references.fillna({'reference_type': 'U'}).reset_index(drop=True)
+
+    with open(path, encoding='utf-8-sig') as f:
+        text = f.read()
+    if file_format == 'bibtex':
+        return __ReadBibTeX(text)
+    return __ReadRIS(text)
+
+# Function to add many references to the database -----------------------------
+def ImportCitations(references, db : str, index : dict = None,
+                    threshold : float = 0.8, dry_run : bool = False) -> pd.DataFrame:
+    '''
+    Adds many references to tblCitations at once.  References that match a
+    citation already in the database (see MatchCitations), or an earlier
+    reference in the same import, are skipped.  Reference codes for the rest
+    are allocated in bulk (see AllocateStrRefCodes) and the citations are 
+    inserted and committed in one transaction, so either all or none of them
+    are added.
+
+    Parameters
+    ----------
+    references : The path of a BibTeX, RIS, or CSV file (see 
+        ReadCitationFile), or a dataframe with columns "reference" and 
+        "reference_type".
+    db : A string containing the name of the database to query.
+    index : An index from BuildCitationIndex.  Default is to build one.
+    threshold : The minimum similarity score (0 to 1) for a reference to be
+        treated as a duplicate.  Default is 0.8.
+    dry_run : If True, report what would be done without changing the 
+        database.  Default is False.
+
+    Returns
+    -------
+    results : A dataframe with a row per reference and columns "reference",
+        "reference_type", "status" ("added", "duplicate", "duplicate in 
+        import", or "invalid" when there is no author or year), 
+        "strRefCode" (the new code, or the duplicate's code), and "score".
+    '''
+    if isinstance(references, str):
+        references = ReadCitationFile(references)
+    results = references[['reference', 'reference_type']].reset_index(drop=True).copy()
+    results['status'] = None
+    results['strRefCode'] = None
+    results['score'] = None
+
+    if index is None:
+        index = BuildCitationIndex(db)
+
+    # References without an author or year can't be given a code
+    parsed = [ParseCitation(x) for x in results['reference']]
+    invalid = [not (x['author'] and re.search(r'\d{4}', y)) 
+               for x, y in zip(parsed, results['reference'])]
+    results.loc[invalid, 'status'] = 'invalid'
+
+    # Duplicates of citations in the database
+    matches = MatchCitations(results['reference'], index, threshold, limit=1)
+    matches = matches.drop_duplicates('reference').set_index('reference')
+    duplicate = results['status'].isna() & results['reference'].isin(matches.index)
+    results.loc[duplicate, 'status'] = 'duplicate'
+    results.loc[duplicate, 'strRefCode'] = results.loc[duplicate, 'reference'].map(matches['strRefCode'])
+    results.loc[duplicate, 'score'] = results.loc[duplicate, 'reference'].map(matches['score'])
+
+    # Duplicates of earlier references in this import
+    seen = {}
+    for i in results.index[results['status'].isna()]:
+        tokens = parsed[i]['tokens']
+        for j in seen.get((parsed[i]['year'], parsed[i]['author']), []):
+            union = len(tokens | parsed[j]['tokens'])
+            score = len(tokens & parsed[j]['tokens']) / union if union else 0
+            if score >= threshold:
+                results.loc[i, ['status', 'score']] = ['duplicate in import', score]
+                break
+        else:
+            seen.setdefault((parsed[i]['year'], parsed[i]['author']), []).append(i)
+
+    new = results['status'].isna()
+    results.loc[new, 'status'] = 'added'
+    if dry_run or not new.any():
+        return results
+
+    prefixes = [__RefCodePrefix(x, y) for x, y in 
+                zip(results.loc[new, 'reference'], 
+                    results.loc[new, 'reference_type'])]
+
+    # Connect to database
+    cursor, connection = database.ConnectDB_pyodbc(db)
+
+    try:
+        # Allocate the codes and insert the citations in one transaction
+        results.loc[new, 'strRefCode'] = __AllocateCodes(prefixes, cursor, 
+                                                         connection)
+        database.BulkInsert(cursor, "dbo.tblCitations",
+                            results.loc[new, ['strRefCode', 'reference']]
+                            .rename(columns={'reference': 'memCitation'}),
+                            commit=False)
+        __CommitCodes(cursor, connection)
+
+    except Exception as e:
+        connection.rollback()
+        print(e)
+        raise
+
+    finally:
+        cursor.close()
+        connection.close()
+
+    print(f"{new.sum()} references added to database")
+    return results
+
+
+# Functions to find duplicate citations across the database -------------------
+def __Shingles(citation : str, k : int) -> set:
+    '''
+    Returns the set of k-character shingles of a citation, after removing
+    accents, case, punctuation, and extra spaces.
+    '''
+    import unicodedata
+
+    text = unicodedata.normalize('NFKD', str(citation))
+    text = text.encode('ascii', 'ignore').decode('ascii').lower()
+    text = ' '.join(re.findall(r'[a-z0-9]+', text))
+    return set([text[i:i + k] for i in range(max(len(text) - k + 1, 1))])
+
+def __ClusterBlocks(blocks : list, threshold : float, k : int) -> list:
+    '''
+    Compares every pair of citations within each of a list of blocks of
+    (row number, citation) tuples and returns (row, row, score) tuples for
+    the pairs whose shingle Jaccard similarity is at least the threshold.
+    '''
+    edges = []
+    for block in blocks:
+        shingles = [(i, __Shingles(x, k)) for i, x in block]
+        for a in range(len(shingles)):
+            i, x = shingles[a]
+            for j, y in shingles[a + 1:]:
+                score = len(x & y) / len(x | y)
+                if score >= threshold:
+                    edges.append((i, j, score))
+    return edges
+
+def ClusterDuplicateCitations(db : str, threshold : float = 0.7, 
+                              shingle_size : int = 4, workers : int = None,
+                              index : dict = None) -> pd.DataFrame:
+    '''
+    Finds clusters of likely duplicate citations in tblCitations.  Citations
+    are blocked by year and normalized first author (see BuildCitationIndex)
+    so only citations within the same block are compared, by the Jaccard
+    similarity of the character shingles of their full text.  Blocks are
+    compared in parallel with a pool of processes.  Citations linked by
+    similar pairs form a cluster, and the citation with the longest (most
+    complete) text is suggested as the cluster's canonical one.
+
+    On Windows, call this from within an "if __name__ == '__main__':" block.
+
+    Parameters
+    ----------
+    db : A string containing the name of the database to query.
+    threshold : The minimum similarity score (0 to 1) for two citations to
+        be treated as duplicates.  Default is 0.7.
+    shingle_size : The number of characters per shingle.  Default is 4.
+    workers : The number of worker processes.  Default is the number of CPUs.
+    index : An index from BuildCitationIndex.  Default is to build one.
+
+    Returns
+    -------
+    clusters : A dataframe with a row per citation in a cluster of two or 
+        more, with columns "cluster", "strRefCode", "memCitation", "score"
+        (its highest similarity to another member), and 
+        "canonical_strRefCode".
+    '''
+    from concurrent.futures import ProcessPoolExecutor
+
+    if index is None:
+        index = BuildCitationIndex(db)
+    citations = index['citations']
+    text = citations['memCitation'].values
+
+    # Only blocks with an author and more than one citation need comparing
+    blocks = [[(i, text[i]) for i in rows] for (year, author), rows 
+              in index['blocks'].items() if author and len(rows) > 1]
+
+    # Send the blocks to the workers in batches, largest first
+    blocks.sort(key=len, reverse=True)
+    n = min(len(blocks), 100)
+    batches = [blocks[i::n] for i in range(n)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        results = pool.map(__ClusterBlocks, batches, 
+                           [threshold] * len(batches), 
+                           [shingle_size] * len(batches))
+        edges = [x for batch in results for x in batch]
+
+    # Join linked citations into clusters
+    parent, score = {}, {}
+    def __root(i):
+        while parent.setdefault(i, i) != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    for i, j, s in edges:
+        parent[__root(i)] = __root(j)
+        score[i] = max(score.get(i, 0), s)
+        score[j] = max(score.get(j, 0), s)
+
+    rows = sorted(parent)
+    clusters = citations.loc[rows, ['strRefCode', 'memCitation']]
+    clusters.insert(0, 'cluster', [__root(i) for i in rows])
+    clusters['score'] = [score[i] for i in rows]
+
+    # Suggest the longest citation in each cluster as the canonical one
+    clusters['length'] = clusters['memCitation'].str.len()
+    canonical = (clusters.sort_values(['length', 'strRefCode'], 
+                                      ascending=[False, True])
+                 .drop_duplicates('cluster')
+                 .set_index('cluster')['strRefCode'])
+    clusters['canonical_strRefCode'] = clusters['cluster'].map(canonical)
+
+    # Number the clusters from 1
+    clusters['cluster'] = clusters['cluster'].rank(method='dense').astype(int)
+    return (clusters.drop(columns='length')
+            .sort_values(['cluster', 'strRefCode'])
+            .reset_index(drop=True))
+
+
 # -----------------------------------------------------------------------------
 def __main():
     pass
@@ -31,10 +31,40 @@ def ConnectDB_pyodbc(db : str,
         print(e)
 
 
+# SQLAlchemy engines, shared by ConnectDB calls -------------------------------
+__engines = {}
+
+def GetEngine(db : str, driver : str = driver, server : str = server):
+    '''
+    Returns a SQLAlchemy engine for the specified database.  The engine is 
+    created once per process and reused, so its connection pool is shared by
+    every ConnectDB call (including calls from different threads).
+
+    Parameters
+    ----------
+    db : Database to connect to (on CHUCK)
+    driver : ODBC driver to use
+    server : Server to connect to
+
+    Returns
+    -------
+    engine : SQLAlchemy engine for the database
+    '''
+    from sqlalchemy import create_engine
+
+    key = (db, driver, server)
+    if key not in __engines:
+        __engines[key] = create_engine('mssql+pyodbc://' + server + '/' + db 
+                                       + '?driver=' + driver)
+    return __engines[key]
+
+
 # ConnectDB function, but using SQLAlchemy instead of pyodbc ------------------
 def ConnectDB(db : str, driver : str = driver, server : str = server) -> tuple:
     '''
     Returns a cursor and connection within the specified database.
+    Connections come from the database's pooled engine (see GetEngine), and
+    closing the connection returns it to the pool.
     For troubleshooting db = 'GapVert_48_2016'
 
     Parameters
@@ -49,8 +79,7 @@ def ConnectDB(db : str, driver : str = driver, server : str = server) -> tuple:
     connection : Connection object for the database
     '''
     try:
-        from sqlalchemy import create_engine
-        engine = create_engine('mssql+pyodbc://' + server + '/' + db + '?driver=' + driver)
+        engine = GetEngine(db, driver, server)
         con = engine.connect()
         cursor = con.connection.cursor()
         return cursor, con
@@ -58,6 +87,101 @@ def ConnectDB(db : str, driver : str = driver, server : str = server) -> tuple:
         print(e)
 
 
+# Query with a list of values -------------------------------------------------
+def ReadSQLIn(sql : str, values : list, connection, 
+              chunk_size : int = 1000):
+    '''
+    Runs a query that filters on a list of values and returns the result as
+    a dataframe.  The query must contain "{markers}" where the list of 
+    parameter markers belongs, e.g., "WHERE strUC IN ({markers})".  Long 
+    lists are split into chunks to stay under the server's parameter limit.
+
+    Parameters
+    ----------
+    sql : The query, with "{markers}" in place of the value list.
+    values : A list of values to filter on.
+    connection : A connection, such as the one returned by ConnectDB.
+    chunk_size : The maximum number of values per query.  Default is 1000.
+
+    Returns
+    -------
+    df : A dataframe of the combined results.
+    '''
+    import pandas as pd
+
+    values = list(values)
+    frames = []
+    for start in range(0, max(len(values), 1), chunk_size):
+        chunk = values[start:start + chunk_size]
+        markers = ", ".join(["?"] * len(chunk)) if chunk else "NULL"
+        frames.append(pd.read_sql(sql.format(markers=markers), connection,
+                                  params=chunk))
+
+    return pd.concat(frames, ignore_index=True)
+
+
+# Local cache directory -------------------------------------------------------
+def CacheDirectory(db : str, cache_dir : str = None) -> str:
+    '''
+    Returns the path to a local directory for caching tables read from a GAP
+    database, creating it if necessary.
+
+    Parameters
+    ----------
+    db : The name of the GAP database that the cached tables come from.
+    cache_dir : The root cache directory.  Default is ~/.gapproduction.
+
+    Returns
+    -------
+    path : The path to the cache directory for the database.
+    '''
+    import os
+
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.expanduser("~"), ".gapproduction")
+    path = os.path.join(cache_dir, db)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+# Bulk insert function --------------------------------------------------------
+def BulkInsert(cursor, table : str, df, batch_size : int = 10000,
+               commit : bool = True) -> int:
+    '''
+    Inserts the rows of a dataframe into a table with pyodbc's 
+    fast_executemany, which sends each batch of rows in a single round trip.
+    Column names in the dataframe must match those in the table.  Missing 
+    values (NaN, NA, NaT) are inserted as NULL.
+
+    Parameters
+    ----------
+    cursor : A pyodbc cursor, such as the one returned by ConnectDB_pyodbc.
+    table : The name of the table to insert into (e.g., "dbo.tblRanges" or
+        a temporary staging table like "#stgRanges").
+    df : A pandas dataframe of the rows to insert.
+    batch_size : The number of rows to send per batch.  Default is 10000.
+    commit : Whether to commit after each batch.  Default is True.
+
+    Returns
+    -------
+    count : The number of rows inserted.
+    '''
+    columns = list(df.columns)
+    sql = f"""INSERT INTO {table} ({', '.join(columns)}) 
+              VALUES ({', '.join(['?'] * len(columns))});"""
+
+    # Convert to python objects, with None for missing values
+    rows = df.astype(object).where(df.notna(), None).values.tolist()
+
+    cursor.fast_executemany = True
+    for start in range(0, len(rows), batch_size):
+        cursor.executemany(sql, rows[start:start + batch_size])
+        if commit:
+            cursor.connection.commit()
+
+    return len(rows)
+
+
 # -----------------------------------------------------------------------------
 def __main():
     pass
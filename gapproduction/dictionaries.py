@@ -283,6 +283,55 @@ def IterableOfIterablesToDictionary(lot, itemsInKey=1):
     return dict
 
 
+def DataFrameToGroupedDict(df, key):
+    '''
+    (DataFrame, string) -> dictionary
+
+    Returns a dictionary in which the keys are the distinct values of a 
+        dataframe column, and the values are lists of dictionaries, one per
+        row with that value, of the remaining columns.  Rows keep their order
+        within each list.
+
+    Arguments:
+    df -- A pandas dataframe.
+    key -- The name of the column to group by.
+
+    Example:
+    >>> df = pd.DataFrame({'strUC': ['bAMROx', 'bAMROx', 'mAMMAx'], 'editor': ['nmt', 'mjr', 'nmt']})
+    >>> DataFrameToGroupedDict(df, 'strUC')
+    {'bAMROx': [{'editor': 'nmt'}, {'editor': 'mjr'}], 'mAMMAx': [{'editor': 'nmt'}]}
+    '''
+    return {k: g.drop(columns=key).to_dict('records') 
+            for k, g in df.groupby(key, sort=False)}
+
+
+def FormatDates(df, columns):
+    '''
+    (DataFrame, list) -> DataFrame
+
+    Returns a copy of a dataframe with its date columns reformatted as 
+        "%Y-%m-%d" strings, removing the time component, and missing values
+        replaced with None, ready for DataFrameToGroupedDict.
+
+    Arguments:
+    df -- A pandas dataframe.
+    columns -- A list of the names of the date columns.
+
+    Example:
+    >>> df = pd.DataFrame({'strUC': ['bAMROx'], 'edit_date': [pd.Timestamp('2016-05-04 13:00')], 'editor': [None]})
+    >>> FormatDates(df, ['edit_date'])
+        strUC   edit_date editor
+    0  bAMROx  2016-05-04   None
+    '''
+    import pandas as pd
+
+    # Work on a copy so the input is left untouched
+    df = df.copy()
+    for column in columns:
+        df[column] = pd.to_datetime(df[column]).dt.strftime("%Y-%m-%d")
+    return df.astype(object).where(df.notna(), None)
+
+
 def StateFIPSDict(stateKeys=False):
 
     if stateKeys:
@@ -1,9 +1,34 @@
 """
 This module supports GAP habitat map production and management.
 """
-from gapproduction import database, dictionaries, taxonomy, ranges
+from gapproduction import database, dictionaries, taxonomy, ranges, strings
 import pandas as pd
 
+# In-memory cache of species dossiers, by database and species code (see
+# SpeciesDossier)
+__dossierCache = {}
+
+# Ancillary variables reported by ModelAsDictionary
+__modelVariables = ["ysnHandModel", "ysnHydroFW", "intFromBuffFW", 
+                    "intIntoBuffFW", "ysnHydroOW", "intFromBuffOW", 
+                    "intIntoBuffOW", "ysnHydroWV", "intFromBuffWV", 
+                    "intIntoBuffWV", "strSalinity", "strStreamVel", 
+                    "strOSMWuse", "strOSMWbuff", "ysnOSMWbig", "strEdgeType",
+                    "intEdgeEcoWidth", "strUseForInt", "strForIntBuffer", 
+                    "cbxContPatch", "intContPatchSize", "intAuxBuff", 
+                    "strAvoid", "ysnUrbanExclude", "ysnUrbanInclude", 
+                    "intElevMin", "intElevMax", "intSlopeMin", "intSlopeMax",
+                    "intPercentCanopy"]
+
+# In-memory cache of region EVT sets, by database (see RegionEVTSets)
+__regionEVTCache = {}
+
+# Range seasons that each model season (8th character of the model code) is
+# checked against
+__modelSeasonRanges = {'s': ['summer'], 'w': ['winter'], 
+                       'y': ['year-round', 'summer', 'winter']}
+
+
 def ProcessingNotesDict(species_code : str, db : str = "GapVert_48_2016") -> dict: 
     '''
     Returns a dictionary of processing notes for a given species code.
@@ -119,7 +144,8 @@ def ModelEVTs(modelCode : str, db : str, EVT_format : str = 'names') -> list:
                     INNER JOIN dbo.tblSppMapUnitPres AS s 
                     ON t.intEVT_Code = s.intEVT_Code
                     WHERE s.ysnPres='True' 
-                    AND s.strSpeciesModelCode = '{modelCode}'"""
+                    AND s.strSpeciesModelCode = '{modelCode}'
+                    ORDER BY t.strEVT_Name"""
             prim = list(cursor.execute(sql).fetchall())
 
             # Query the auxiliary map units
@@ -128,7 +154,8 @@ def ModelEVTs(modelCode : str, db : str, EVT_format : str = 'names') -> list:
                     INNER JOIN dbo.tblSppMapUnitPres AS s
                     ON t.intEVT_Code = s.intEVT_Code
                     WHERE s.ysnPresAuxiliary='True'
-                    AND s.strSpeciesModelCode = '{modelCode}'"""
+                    AND s.strSpeciesModelCode = '{modelCode}'
+                    ORDER BY t.strEVT_Name"""
             aux = list(cursor.execute(sql).fetchall())
 
             # Combine codes and names in a way that can be serialized by JSON
@@ -149,10 +176,290 @@ def ModelEVTs(modelCode : str, db : str, EVT_format : str = 'names') -> list:
         return False, False
 
 
+def ModelEVTMatrices(db : str, models : list = None) -> tuple:
+    '''
+    Returns the primary and auxiliary EVT selections of every model as two
+    sparse boolean model x EVT matrices.  tblSppMapUnitPres is read once, so
+    catalog-wide questions such as "which models use EVT X" (a column of a
+    matrix) or "how many primary EVTs does each model have" (the row sums)
+    can be answered without calling ModelEVTs for each model.
+
+    Parameters
+    ----------
+    db -- The name of the GAP database to query.
+    models -- An optional list of model codes to limit the selections read
+        to.  Default is all models.
+
+    Returns
+    -------
+    prim -- A scipy.sparse CSR matrix of models (rows) by EVTs (columns)
+        where ysnPres is true.
+    aux -- A scipy.sparse CSR matrix of models (rows) by EVTs (columns) where
+        ysnPresAuxiliary is true.
+    models -- A pandas Index of the model codes for the rows.
+    EVTs -- A dataframe with columns "intEVT_Code" and "strEVT_Name" for the
+        columns, from tblMapUnitDesc.
+
+    Example:
+    >>> prim, aux, models, EVTs = ModelEVTMatrices("GapVert_48_2016")
+    >>> column = EVTs.index[EVTs["intEVT_Code"] == 9001][0]
+    >>> models[prim[:, column].nonzero()[0]]
+    '''
+    import numpy as np
+    from scipy import sparse
+
+    # Connect to the desired model database
+    cursor, conn = database.ConnectDB(db)
+
+    # Read the EVT descriptions and the model selections
+    sql = """SELECT intEVT_Code, strEVT_Name FROM dbo.tblMapUnitDesc;"""
+    EVTs = pd.read_sql(sql, conn)
+    EVTs["strEVT_Name"] = EVTs["strEVT_Name"].str.strip()
+    EVTs = EVTs.sort_values("intEVT_Code", ignore_index=True)
+
+    sql = """SELECT strSpeciesModelCode, intEVT_Code,
+                    CAST(ysnPres AS int) AS ysnPres,
+                    CAST(ysnPresAuxiliary AS int) AS ysnPresAuxiliary
+             FROM dbo.tblSppMapUnitPres
+             WHERE (ysnPres = 1 OR ysnPresAuxiliary = 1)"""
+    if models is None:
+        df = pd.read_sql(sql, conn)
+    else:
+        sql += " AND strSpeciesModelCode IN ({markers})"
+        df = database.ReadSQLIn(sql, models, conn)
+
+    # Delete the cursor and close the connection
+    cursor.close()
+    conn.close()
+
+    # Drop selections of EVTs that are not in tblMapUnitDesc, as the join in
+    # ModelEVTs does
+    columns = pd.Index(EVTs["intEVT_Code"]).get_indexer(df["intEVT_Code"])
+    df = df[columns >= 0]
+    columns = columns[columns >= 0]
+    rows, models = pd.factorize(df["strSpeciesModelCode"], sort=True)
+
+    # Build the matrices
+    def __matrix(mask):
+        mask = mask.to_numpy(dtype=bool)
+        return sparse.csr_matrix((np.ones(mask.sum(), dtype=bool),
+                                  (rows[mask], columns[mask])),
+                                 shape=(len(models), len(EVTs)))
+
+    prim = __matrix(df["ysnPres"] == 1)
+    aux = __matrix(df["ysnPresAuxiliary"] == 1)
+
+    return prim, aux, pd.Index(models), EVTs
+
+
+def ModelMinHashIndex(db : str, EVT_type : str = 'both',
+                      num_perm : int = 128, bands : int = 32,
+                      seed : int = 1) -> dict:
+    '''
+    Builds a MinHash/LSH index of every model's EVT selections for finding
+    models with similar selections (see SimilarModels and
+    SimilarModelPairs).  Each model's set of EVTs is summarized by num_perm
+    MinHash values, and the signatures are split into bands that are hashed
+    into buckets, so that models with similar EVT sets share buckets.
+
+    Parameters
+    ----------
+    db -- The name of the GAP database to query.
+    EVT_type -- Which selections to compare: 'primary', 'auxiliary', or
+        'both' (default), in which primary and auxiliary selections of the
+        same EVT count as different items.
+    num_perm -- The number of MinHash functions.  Default is 128.
+    bands -- The number of LSH bands; must divide num_perm.  More bands find
+        less similar pairs.  Default is 32.
+    seed -- The random seed for the hash functions.
+
+    Returns
+    -------
+    index -- A dictionary with keys "models" (a pandas Index of model codes),
+        "signatures" (an array of MinHash signatures, one row per model),
+        "buckets" (a list with a dictionary of bucket members for each band),
+        and "bands".
+    '''
+    import numpy as np
+    from scipy import sparse
+
+    if num_perm % bands != 0:
+        raise ValueError("bands must divide num_perm")
+
+    # Get each model's set of EVT selections
+    prim, aux, models, EVTs = ModelEVTMatrices(db)
+    sets = {'primary': prim, 'auxiliary': aux,
+            'both': sparse.hstack([prim, aux]).tocsr()}[EVT_type]
+
+    # Hash every item with each of the hash functions (a * x + b) mod p
+    p = 2**31 - 1
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, p, size=num_perm, dtype=np.int64)
+    b = rng.integers(0, p, size=num_perm, dtype=np.int64)
+    items = np.arange(sets.shape[1], dtype=np.int64)[:, None]
+    hashes = (a * items + b) % p
+
+    # The signature of a model is the minimum hash of its items; models
+    # without any items get p for every hash
+    signatures = np.full((len(models), num_perm), p, dtype=np.int64)
+    counts = np.diff(sets.indptr)
+    nonempty = counts > 0
+    if sets.nnz > 0:
+        signatures[nonempty] = np.minimum.reduceat(hashes[sets.indices],
+                                                   sets.indptr[:-1][nonempty])
+
+    # Put the models into buckets by band
+    rows = num_perm // bands
+    buckets = []
+    for band in range(bands):
+        band_buckets = {}
+        keys = signatures[:, band * rows:(band + 1) * rows]
+        for i in np.flatnonzero(nonempty):
+            band_buckets.setdefault(keys[i].tobytes(), []).append(i)
+        buckets.append(band_buckets)
+
+    return {"models": models, "signatures": signatures, "buckets": buckets,
+            "bands": bands}
+
+
+def SimilarModels(modelCode : str, index : dict, k : int = 10,
+                  same_species : bool = False) -> pd.DataFrame:
+    '''
+    Returns the models whose EVT selections are most similar to those of a
+    model, using an index from ModelMinHashIndex.  Only models that share an
+    LSH bucket with the model are compared.
+
+    Parameters
+    ----------
+    modelCode -- The 9-character GAP model code to find similar models for.
+    index -- An index returned by ModelMinHashIndex.
+    k -- The maximum number of models to return.  Default is 10.
+    same_species -- Whether to only return models for the same species,
+        e.g., to compare a species' models across regions.  Default is False.
+
+    Returns
+    -------
+    similar -- A dataframe with columns "strSpeciesModelCode" and
+        "similarity" (the estimated Jaccard similarity of the EVT sets),
+        sorted by decreasing similarity.
+    '''
+    import numpy as np
+
+    models, signatures = index["models"], index["signatures"]
+    query = models.get_loc(modelCode)
+    rows = signatures.shape[1] // index["bands"]
+
+    # Gather the models that share a bucket with the query model
+    candidates = set()
+    for band, band_buckets in enumerate(index["buckets"]):
+        key = signatures[query, band * rows:(band + 1) * rows].tobytes()
+        candidates.update(band_buckets.get(key, []))
+    candidates.discard(query)
+    candidates = np.array(sorted(candidates), dtype=np.int64)
+    if same_species and len(candidates) > 0:
+        candidates = candidates[models[candidates].str[:6] == modelCode[:6]]
+
+    # Rank them by estimated Jaccard similarity
+    similarity = (signatures[candidates] == signatures[query]).mean(axis=1)
+    similar = pd.DataFrame({"strSpeciesModelCode": models[candidates],
+                            "similarity": similarity})
+
+    return similar.sort_values("similarity", ascending=False,
+                               ignore_index=True).head(k)
+
+
+def SimilarModelPairs(index : dict, threshold : float = 0.8,
+                      same_species : bool = False) -> pd.DataFrame:
+    '''
+    Returns all pairs of models whose EVT selections have an estimated
+    Jaccard similarity of at least threshold, using an index from
+    ModelMinHashIndex.  Only pairs that share an LSH bucket are compared.
+
+    Parameters
+    ----------
+    index -- An index returned by ModelMinHashIndex.
+    threshold -- The minimum estimated similarity.  Default is 0.8.
+    same_species -- Whether to only return pairs of models for the same
+        species.  Default is False.
+
+    Returns
+    -------
+    pairs -- A dataframe with columns "model_1", "model_2", and "similarity",
+        sorted by decreasing similarity.
+    '''
+    import itertools
+    import numpy as np
+
+    models, signatures = index["models"], index["signatures"]
+
+    # Gather the pairs of models that share a bucket
+    pairs = set()
+    for band_buckets in index["buckets"]:
+        for members in band_buckets.values():
+            pairs.update(itertools.combinations(members, 2))
+    pairs = np.array(sorted(pairs), dtype=np.int64).reshape(-1, 2)
+
+    # Estimate their similarity
+    similarity = (signatures[pairs[:, 0]] == signatures[pairs[:, 1]]).mean(axis=1)
+    pairs = pd.DataFrame({"model_1": models[pairs[:, 0]],
+                          "model_2": models[pairs[:, 1]],
+                          "similarity": similarity})
+    pairs = pairs[pairs["similarity"] >= threshold]
+    if same_species:
+        pairs = pairs[pairs["model_1"].str[:6] == pairs["model_2"].str[:6]]
+
+    return pairs.sort_values("similarity", ascending=False, ignore_index=True)
+
+
+def RegionEVTSets(db : str, refresh : bool = False) -> tuple:
+    """
+    Returns the EVTs in each modeling region as sets, along with EVT names.
+    tblMapUnitGapRegion and tblMapUnitDesc are read once per database and
+    kept in memory, so later calls (including those made by EVTsInRegion) do
+    not query the database.
+
+    Parameters
+    ----------
+    db : str
+        The name of the database to query.
+    refresh : bool
+        Whether to reload the tables from the database. Default is False.
+
+    Returns
+    -------
+    region_EVTs : dict
+        A dictionary with region codes (int) as keys and frozensets of EVT
+        codes as values.
+    EVT_names : dict
+        A dictionary with EVT codes as keys and EVT names as values.
+    """
+    if refresh or db not in __regionEVTCache:
+        # Connect to the desired model database
+        cursor, conn = database.ConnectDB(db)
+
+        sql = """SELECT DISTINCT intRegionCode, intEVT_Code
+                 FROM dbo.tblMapUnitGapRegion;"""
+        pairs = pd.read_sql(sql, conn)
+
+        sql = """SELECT intEVT_Code, strEVT_Name FROM dbo.tblMapUnitDesc;"""
+        names = pd.read_sql(sql, conn)
+
+        # Delete the cursor and close the connection
+        cursor.close()
+        conn.close()
+
+        region_EVTs = {int(region): frozenset(codes.tolist()) for region, codes
+                       in pairs.groupby("intRegionCode")["intEVT_Code"]}
+        EVT_names = dict(zip(names["intEVT_Code"], names["strEVT_Name"]))
+        __regionEVTCache[db] = (region_EVTs, EVT_names)
+
+    return __regionEVTCache[db]
+
+
 def EVTsInRegion(regions: list, db : str, EVT_format : str = 'names') -> list:
     """
     Returns a list of EVTs within a modeling region or regions. Data is pulled
-    from tblMapUnitGapRegion.
+    from tblMapUnitGapRegion, which is cached in memory by RegionEVTSets.
 
     Parameters
     ----------
@@ -168,9 +475,6 @@ def EVTsInRegion(regions: list, db : str, EVT_format : str = 'names') -> list:
     EVTs : list
         A list of LandFire existing vegetation types.
     """
-    # Connect to the desired model database
-    cursor, conn = database.ConnectDB(db)
-
     # REGION CODES -----------------------------------------------------------
     # Get the region codes, if a list of abbreviations was provided (e.g., NW)
     region_dict = dictionaries.regionsDict_Abbr_To_Num
@@ -179,37 +483,193 @@ def EVTsInRegion(regions: list, db : str, EVT_format : str = 'names') -> list:
     if all(isinstance(x, str) for x in regions):
         regions = [region_dict[x] for x in regions]
 
-    # Make the region codes a list of strings
-    regions = [str(x) for x in regions]
-
     # GET THE EVTS -----------------------------------------------------------
+    region_EVTs, EVT_names = RegionEVTSets(db)
+    codes = set().union(*[region_EVTs.get(int(x), frozenset()) 
+                          for x in regions])
+
     if EVT_format == 'codes':
-        # Query the EVTs
-        sql = f"""SELECT DISTINCT intEVT_Code
-                FROM dbo.tblMapUnitGapRegion
-                WHERE intRegionCode IN ({', '.join(regions)})"""
-        EVTs = pd.read_sql(sql, conn)
-        EVTs = EVTs['intEVT_Code'].tolist()
+        EVTs = sorted(codes)
 
     elif EVT_format == 'names':
-        # Query the EVTs
-        sql = f"""SELECT DISTINCT t.strEVT_Name
-                FROM dbo.tblMapUnitDesc AS t
-                INNER JOIN dbo.tblMapUnitGapRegion AS s
-                ON t.intEVT_Code = s.intEVT_Code
-                WHERE s.intRegionCode IN ({', '.join(regions)})"""
-        EVTs = pd.read_sql(sql, conn)
-        EVTs = EVTs['strEVT_Name'].tolist()
-        EVTs.sort()
-
-    # Delete the WHRdb cursor and close the connection
-    cursor.close()
-    conn.close()
+        EVTs = sorted(set([EVT_names[x] for x in codes if x in EVT_names]))
 
     # Return EVT list
     return EVTs
 
 
+def ModelEVTConsistency(db : str, cache_dir : str = None,
+                        violations_only : bool = True) -> pd.DataFrame:
+    '''
+    Checks every model's primary and auxiliary EVT selections against the
+    EVTs that occur in the model's region (tblMapUnitGapRegion, as in
+    EVTsInRegion) and in the species' seasonal range (as in
+    RangeEVTs_season).  The region is read from the 9th character of the
+    model code and the season from the 8th; summer and winter models are
+    checked against the summer or winter and year-round range, and
+    year-round models against the whole range.
+
+    Everything is computed as joins over the full tables rather than model
+    by model.
+
+    Parameters
+    ----------
+    db -- The name of the GAP database to query.
+    cache_dir -- The root cache directory for the HUC x EVT matrix (see
+        database.CacheDirectory).
+    violations_only -- Whether to return only selections that are outside
+        the model's region or range.  Default is True.
+
+    Returns
+    -------
+    report -- A dataframe with columns "strSpeciesModelCode", "strUC",
+        "intRegionCode", "season", "selection" ('primary' or 'auxiliary'),
+        "intEVT_Code", "strEVT_Name", "ysnInRegion", and "ysnInRange".
+    '''
+    # Get every model's EVT selections as a long table
+    prim, aux, models, EVTs = ModelEVTMatrices(db)
+    frames = []
+    for selection, matrix in [('primary', prim), ('auxiliary', aux)]:
+        rows, columns = matrix.nonzero()
+        frames.append(pd.DataFrame({"strSpeciesModelCode": models[rows],
+                                    "selection": selection,
+                                    "intEVT_Code": EVTs["intEVT_Code"].values[columns],
+                                    "strEVT_Name": EVTs["strEVT_Name"].values[columns]}))
+    report = pd.concat(frames, ignore_index=True)
+    report.insert(1, "strUC", report["strSpeciesModelCode"].str[:6])
+    report.insert(2, "intRegionCode",
+                  pd.to_numeric(report["strSpeciesModelCode"].str[8],
+                                errors="coerce").astype("Int64"))
+    report.insert(3, "season", report["strSpeciesModelCode"].str[7])
+
+    # Join to the EVTs in each region
+    region_EVTs = pd.DataFrame([(region, code) for region, codes 
+                                in RegionEVTSets(db)[0].items()
+                                for code in codes],
+                               columns=["intRegionCode", "intEVT_Code"])
+    region_EVTs = region_EVTs.astype({"intRegionCode": "Int64"})
+    region_EVTs["ysnInRegion"] = True
+    report = report.merge(region_EVTs, on=["intRegionCode", "intEVT_Code"],
+                          how="left")
+
+    # Join to the EVTs in each species' seasonal range
+    range_EVTs = ranges.RangeEVTs_seasonBatch(None, __modelSeasonRanges, db,
+                                              cache_dir)
+    range_EVTs = pd.DataFrame({"strUC": range_EVTs["strUC"],
+                               "season": range_EVTs["season_set"].astype(str),
+                               "intEVT_Code": range_EVTs["intEVT_Code"],
+                               "ysnInRange": True})
+    report = report.merge(range_EVTs, on=["strUC", "season", "intEVT_Code"],
+                          how="left")
+
+    report["ysnInRegion"] = report["ysnInRegion"].fillna(False).astype(bool)
+    report["ysnInRange"] = report["ysnInRange"].fillna(False).astype(bool)
+
+    if violations_only:
+        report = report[~(report["ysnInRegion"] & report["ysnInRange"])]
+
+    return report.sort_values(["strSpeciesModelCode", "selection",
+                               "strEVT_Name"], ignore_index=True)
+
+
+def ModelParameters(db : str, cache_dir : str = None,
+                    refresh : bool = False) -> pd.DataFrame:
+    '''
+    Returns the parameters of every model, from tblModelAncillary joined
+    with tblModelInfo, as a typed dataframe with one row per model.  The
+    tables are read once and cached locally (see database.CacheDirectory),
+    so later calls load the dataframe from disk.
+
+    Columns are typed by their prefix: "ysn" and "cbx" columns are boolean,
+    "int" columns are nullable integers, and "str" and "mem" columns are
+    strings.  "season" and "intRegionCode" columns are added from the 8th
+    and 9th characters of the model code.
+
+    Parameters
+    ----------
+    db -- The name of the GAP database to query.
+    cache_dir -- The root cache directory (see database.CacheDirectory).
+    refresh -- Whether to reread the tables from the database.  Default is
+        False.
+
+    Returns
+    -------
+    parameters -- A dataframe indexed by strSpeciesModelCode.
+    '''
+    import os
+
+    cache_file = os.path.join(database.CacheDirectory(db, cache_dir),
+                              "model_parameters.pkl")
+
+    if refresh or not os.path.exists(cache_file):
+        # Connect to the GAP database
+        cursor, connection = database.ConnectDB(db)
+
+        sql = """SELECT mi.*, anc.*
+                 FROM dbo.tblModelInfo AS mi
+                 INNER JOIN dbo.tblModelAncillary AS anc
+                 ON mi.strSpeciesModelCode = anc.strSpeciesModelCode;"""
+        parameters = pd.read_sql(sql, connection)
+        cursor.close()
+        connection.close()
+
+        # Drop the duplicate columns from the join
+        parameters = parameters.loc[:, ~parameters.columns.duplicated()]
+
+        # Type the columns by prefix
+        for column in parameters.columns:
+            if column.startswith(("ysn", "cbx")):
+                parameters[column] = parameters[column].astype("boolean")
+            elif column.startswith("int"):
+                parameters[column] = parameters[column].astype("Int64")
+            elif column.startswith(("str", "mem")):
+                parameters[column] = parameters[column].astype("string")
+
+        # Add the season and region from the model code
+        codes = parameters["strSpeciesModelCode"]
+        parameters["season"] = codes.str[7].astype("category")
+        parameters["intRegionCode"] = pd.to_numeric(codes.str[8],
+                                                    errors="coerce").astype("Int64")
+
+        parameters = parameters.set_index("strSpeciesModelCode")
+        parameters.to_pickle(cache_file)
+
+    return pd.read_pickle(cache_file)
+
+
+def QueryModels(predicate, db : str, cache_dir : str = None) -> pd.DataFrame:
+    '''
+    Returns the parameters of the models that match a predicate, using the
+    cached table from ModelParameters.
+
+    Parameters
+    ----------
+    predicate -- Either a pandas query string over the ModelParameters
+        columns, or a function that takes the ModelParameters dataframe and
+        returns a boolean Series.
+    db -- The name of the GAP database to query.
+    cache_dir -- The root cache directory (see database.CacheDirectory).
+
+    Returns
+    -------
+    models -- A dataframe of the matching models' parameters, indexed by
+        strSpeciesModelCode.
+
+    Example:
+    >>> QueryModels("intElevMax < 1500 and ysnHydroFW", "GapVert_48_2016")
+    >>> QueryModels("strEdgeType == 'Forest/Open' and intRegionCode == 4",
+    ...             "GapVert_48_2016")
+    '''
+    parameters = ModelParameters(db, cache_dir)
+
+    if callable(predicate):
+        return parameters[predicate(parameters).fillna(False).astype(bool)]
+
+    # Comparisons with NULL values give NA, which is treated as no match
+    mask = parameters.eval(predicate)
+    return parameters[mask.fillna(False).astype(bool)]
+
+
 def ModelAsDictionary(model : str, db : str) -> dict:
     '''
     Returns a dictionary that includes a key for each of a regional model's 
@@ -384,6 +844,287 @@ def ModelAsDictionary(model : str, db : str) -> dict:
     return modelDict
 
 
+def ModelFingerprints(db : str, cache_dir : str = None) -> pd.Series:
+    '''
+    Returns a stable content hash for every region-season model, covering
+    the ancillary variables, primary and auxiliary EVTs, and taxon names
+    that ModelAsDictionary reports.  A model's fingerprint only changes when
+    one of those values changes.
+
+    The tables are read fresh from the database (the ModelParameters cache
+    is refreshed).
+
+    Parameters
+    ----------
+    db -- The name of the GAP database to query.
+    cache_dir -- The root cache directory (see database.CacheDirectory).
+
+    Returns
+    -------
+    fingerprints -- A Series of SHA-256 hex digests indexed by model code.
+    '''
+    import json
+    import hashlib
+
+    # Read the ancillary variables, EVT selections, and taxon names
+    parameters = ModelParameters(db, cache_dir, refresh=True)
+    parameters = parameters[[x for x in __modelVariables
+                             if x in parameters.columns]]
+    parameters = parameters.astype(object).where(parameters.notna(), None)
+    prim, aux, models, EVTs = ModelEVTMatrices(db)
+    codes = EVTs["intEVT_Code"].values
+
+    cursor, connection = database.ConnectDB(db)
+    sql = """SELECT strUC, strComName, strSciName FROM dbo.tblTaxa;"""
+    taxa = pd.read_sql(sql, connection).set_index("strUC")
+    cursor.close()
+    connection.close()
+
+    # Hash a canonical JSON document for each model
+    fingerprints = {}
+    for model, values in zip(parameters.index, parameters.to_dict("records")):
+        document = dict(values)
+        if model in models:
+            row = models.get_loc(model)
+            document["PrimEVTs"] = sorted(codes[prim[row].indices].tolist())
+            document["AuxEVTs"] = sorted(codes[aux[row].indices].tolist())
+        if model[:6] in taxa.index:
+            document["CommonName"] = taxa.at[model[:6], "strComName"]
+            document["ScientificName"] = taxa.at[model[:6], "strSciName"]
+        text = json.dumps(document, sort_keys=True, default=str)
+        fingerprints[model] = hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    return pd.Series(fingerprints, name="strFingerprint")
+
+
+def IncrementalModelExport(db : str, exporters : dict, manifest : str,
+                           models : list = None, force : bool = False,
+                           cache_dir : str = None) -> list:
+    '''
+    Runs export functions (e.g., ones that write a model's JSON, report, and
+    raster outputs) only for models whose fingerprint (see
+    ModelFingerprints) has changed since the last run.  A JSON manifest
+    records the fingerprint each model had when it was last exported
+    successfully.
+
+    Parameters
+    ----------
+    db -- The name of the GAP database to query.
+    exporters -- A dictionary of export functions by name; each is called as
+        function(model, db).  A model is recorded in the manifest only if
+        all of the functions succeed.
+    manifest -- The path to the JSON manifest file.
+    models -- An optional list of model codes to limit the export to.
+        Default is all models.
+    force -- Whether to export every model regardless of the manifest.
+        Default is False.
+    cache_dir -- The root cache directory (see database.CacheDirectory).
+
+    Returns
+    -------
+    exported -- A list of the model codes that were exported.
+    '''
+    import os
+    import json
+
+    # Read the manifest from the previous run
+    if os.path.exists(manifest):
+        with open(manifest) as f:
+            entries = json.load(f)
+    else:
+        entries = {}
+
+    # Find the models that changed
+    fingerprints = ModelFingerprints(db, cache_dir)
+    if models is not None:
+        fingerprints = fingerprints[fingerprints.index.isin(models)]
+    if not force:
+        fingerprints = fingerprints[[entries.get(x) != y for x, y
+                                     in fingerprints.items()]]
+
+    # Export them, saving the manifest even if the run is interrupted
+    exported = []
+    try:
+        for model, fingerprint in fingerprints.items():
+            try:
+                for name, function in exporters.items():
+                    function(model, db)
+            except Exception as e:
+                print(f"{model} ({name}): {e}")
+                continue
+            entries[model] = fingerprint
+            exported.append(model)
+    finally:
+        with open(manifest, "w") as f:
+            json.dump(entries, f, indent=2, sort_keys=True)
+
+    return exported
+
+
+def __JSONDefault(value):
+    '''
+    Converts numpy and pandas scalars, dates, and other values that json
+    can't serialize.
+    '''
+    if hasattr(value, "item"):
+        return value.item()
+    return str(value)
+
+
+def IterModelDictionaries(db : str, models : list = None,
+                          cache_dir : str = None, refresh : bool = True):
+    '''
+    Yields a dictionary like the one returned by ModelAsDictionary for each
+    model, built from tables that are read in bulk once (see ModelParameters
+    and ModelEVTMatrices) rather than with one set of queries per model.
+
+    Parameters
+    ----------
+    db -- The name of the GAP database to query.
+    models -- An optional list of model codes to limit the output to, and
+        the EVT selections and taxa read.  Default is all models.
+    cache_dir -- The root cache directory (see database.CacheDirectory).
+    refresh -- Whether to refresh the ModelParameters cache.  Default is
+        True.
+
+    Yields
+    ------
+    modelDict -- A dictionary of a model's variables (see ModelAsDictionary),
+        plus a "ModelCode" key.
+    '''
+    # Read the tables
+    parameters = ModelParameters(db, cache_dir, refresh=refresh)
+    parameters = parameters[[x for x in __modelVariables
+                             if x in parameters.columns]]
+    if models is not None:
+        parameters = parameters[parameters.index.isin(models)]
+    parameters = parameters.sort_index()
+    prim, aux, EVT_models, EVTs = ModelEVTMatrices(
+                                    db, None if models is None 
+                                        else parameters.index.tolist())
+    EVT_records = [{'code': code, 'name': name} for code, name
+                   in zip(EVTs["intEVT_Code"].tolist(), 
+                          EVTs["strEVT_Name"].tolist())]
+
+    # EVTs are listed by name, as ModelEVTs lists them
+    def by_name(i):
+        return (EVT_records[i]['name'] or '', EVT_records[i]['code'])
+
+    cursor, connection = database.ConnectDB(db)
+    sql = """SELECT strUC, strComName, strSciName FROM dbo.tblTaxa"""
+    if models is None:
+        taxa = pd.read_sql(sql, connection)
+    else:
+        sql += " WHERE strUC IN ({markers})"
+        taxa = database.ReadSQLIn(sql, parameters.index.str[:6].unique(),
+                                  connection)
+    taxa = taxa.set_index("strUC")
+    cursor.close()
+    connection.close()
+
+    # Build a dictionary for each model
+    for model in parameters.index:
+        modelDict = {"ModelCode": model}
+
+        # Region and season
+        modelDict["Region"] = dictionaries.regionsDict_Num_To_Name[int(model[8])]
+        modelDict["Season"] = model[7]
+
+        # Taxonomic information
+        species_code = model[0:6]
+        modelDict["SpeciesCode"] = species_code
+        if species_code in taxa.index:
+            modelDict["CommonName"] = taxa.at[species_code, "strComName"]
+            modelDict["ScientificName"] = taxa.at[species_code, "strSciName"]
+        else:
+            modelDict["CommonName"] = None
+            modelDict["ScientificName"] = None
+        names = str(modelDict["ScientificName"]).split(" ")
+        modelDict["SubspeciesName"] = names[2] if len(names) == 3 else None
+
+        # Land Cover Associations
+        if model in EVT_models:
+            row = EVT_models.get_loc(model)
+            modelDict["PrimEVTs"] = [EVT_records[i] for i in 
+                                     sorted(prim[row].indices, key=by_name)]
+            modelDict["AuxEVTs"] = [EVT_records[i] for i in
+                                    sorted(aux[row].indices, key=by_name)]
+        else:
+            modelDict["PrimEVTs"] = []
+            modelDict["AuxEVTs"] = []
+
+        # Ancillary variables, as plain Python values like those returned by
+        # ModelAsDictionary rather than numpy scalars
+        for variable, value in parameters.loc[model].items():
+            if pd.isna(value):
+                value = None
+            elif hasattr(value, "item"):
+                value = value.item()
+            modelDict[variable] = value
+
+        yield modelDict
+
+
+def ExportModelCatalog(db : str, output : str, compress : bool = False,
+                       split_by_class : bool = False, models : list = None,
+                       cache_dir : str = None) -> list:
+    '''
+    Writes every model's dictionary (see IterModelDictionaries) to a
+    newline-delimited JSON (NDJSON) file, one model per line, in a single
+    streaming pass.
+
+    Parameters
+    ----------
+    db -- The name of the GAP database to query.
+    output -- The path of the output file, e.g., "models.ndjson".
+    compress -- Whether to gzip the output; ".gz" is added to file names that
+        don't already end with it.  Default is False.
+    split_by_class -- Whether to write a separate file for each taxon class,
+        named like "models_Birds.ndjson".  Default is False.
+    models -- An optional list of model codes to limit the export to.
+    cache_dir -- The root cache directory (see database.CacheDirectory).
+
+    Returns
+    -------
+    files -- A list of the paths of the files that were written.
+    '''
+    import os
+    import gzip
+    import json
+
+    stem, extension = os.path.splitext(output)
+    if extension == ".gz":
+        stem, extension = os.path.splitext(stem)
+
+    def __path(suffix):
+        path = stem + suffix + extension
+        return path + ".gz" if compress else path
+
+    def __open(path):
+        if compress:
+            return gzip.open(path, "wt", encoding="utf-8")
+        return open(path, "w", encoding="utf-8")
+
+    # Write the models, opening a file for each class as it's reached
+    files = {}
+    try:
+        for modelDict in IterModelDictionaries(db, models, cache_dir):
+            if split_by_class:
+                taxon = modelDict["SpeciesCode"][0]
+                key = "_" + dictionaries.taxaDict.get(taxon, taxon)
+            else:
+                key = ""
+            if key not in files:
+                files[key] = __open(__path(key))
+            files[key].write(json.dumps(modelDict, default=__JSONDefault)
+                             + "\n")
+    finally:
+        for f in files.values():
+            f.close()
+
+    return [__path(x) for x in files]
+
+
 def ReviewNotesDict(species_code : str, db : str = "GapVert_48_2016") -> dict: 
     '''
     Returns a dictionary of review notes for a given species code.
@@ -422,6 +1163,194 @@ def ReviewNotesDict(species_code : str, db : str = "GapVert_48_2016") -> dict:
     return review_notes
 
 
+def ProcessingNotesDictBatch(species_codes = "all",
+                             db : str = "GapVert_48_2016") -> dict:
+    '''
+    Returns the processing notes (see ProcessingNotesDict) for many species,
+    read from tblProcessingUC with one query.
+
+    Parameters
+    ----------
+    species_codes -- A list of species' unique GAP IDs ("strUC"), or "all".
+    db -- The database to connect to.  Default is "GapVert_48_2016".
+
+    Returns
+    -------
+    processing_notes -- A dictionary with species codes as keys and
+        dictionaries of the species' processing notes as values.
+    '''
+    # Connect to the GAP database
+    cursor, connection = database.ConnectDB(db)
+
+    # Query the processing notes
+    sql = """SELECT strUC, strNULLraster AS null123_filename,
+                    dtmNULLdate AS processing_date,
+                    strNULLuser AS who_created,
+                    strNULLcode AS script_name
+             FROM tblProcessingUC"""
+    if isinstance(species_codes, str) and species_codes == "all":
+        df = pd.read_sql(sql, connection)
+    else:
+        df = database.ReadSQLIn(sql + " WHERE strUC IN ({markers})",
+                                species_codes, connection)
+    cursor.close()
+    connection.close()
+
+    # Reformat the dates and group by species, keeping the first note as
+    # ProcessingNotesDict does
+    df = dictionaries.FormatDates(df, ["processing_date"])
+    notes = dictionaries.DataFrameToGroupedDict(df, "strUC")
+
+    return {k: v[0] for k, v in notes.items()}
+
+
+def ReviewNotesDictBatch(species_codes = "all",
+                         db : str = "GapVert_48_2016") -> dict:
+    '''
+    Returns the review notes (see ReviewNotesDict) for many species, read
+    from tblSppReview with one query.
+
+    Parameters
+    ----------
+    species_codes -- A list of species' unique GAP IDs ("strUC"), or "all".
+    db -- The database to connect to.  Default is "GapVert_48_2016".
+
+    Returns
+    -------
+    review_notes -- A dictionary with species codes as keys and lists of
+        dictionaries of the species' review notes as values.
+    '''
+    # Connect to the GAP database
+    cursor, connection = database.ConnectDB(db)
+
+    # Query the review notes
+    sql = """SELECT strUC, strEvent AS event,
+                    dtmReviewDate AS event_date,
+                    whoReviewer AS reviewer,
+                    memReviewText AS event_description
+             FROM tblSppReview"""
+    if isinstance(species_codes, str) and species_codes == "all":
+        df = pd.read_sql(sql, connection)
+    else:
+        df = database.ReadSQLIn(sql + " WHERE strUC IN ({markers})",
+                                species_codes, connection)
+    cursor.close()
+    connection.close()
+
+    # Order by date, reformat the dates, and group by species
+    df = df.sort_values(["strUC", "event_date"], kind="stable")
+    df = dictionaries.FormatDates(df, ["event_date"])
+
+    return dictionaries.DataFrameToGroupedDict(df, "strUC")
+
+
+def SpeciesDossier(species_codes, db : str = "GapVert_48_2016",
+                   max_workers : int = 6, refresh : bool = False,
+                   cache_dir : str = None):
+    '''
+    Gathers everything published about a species or a list of species:
+    taxon information, included models with their parameters and EVTs,
+    review notes, processing notes, range edits, and range summary counts.
+    The independent queries run concurrently on pooled connections (see
+    database.GetEngine), each covering all of the requested species, and
+    finished dossiers are cached in memory by species.
+
+    Parameters
+    ----------
+    species_codes -- A species' unique GAP ID ("strUC") or a list of them.
+    db -- The database to connect to.  Default is "GapVert_48_2016".
+    max_workers -- The number of queries to run at once.  Default is 6.
+    refresh -- Whether to rebuild dossiers that are already cached, and
+        refresh the ModelParameters cache.  Default is False.
+    cache_dir -- The root cache directory (see database.CacheDirectory).
+
+    Returns
+    -------
+    dossier -- A dictionary with keys "SpeciesCode", "TaxonInfo", "Models"
+        (ModelAsDictionary-style dictionaries by model code), "ReviewNotes",
+        "ProcessingNotes", "RangeEdits", and "RangeSummary" (HUC counts by
+        season and presence), or, if a list was given, a dictionary of them
+        by species code (in the Gap Code capitalization; see 
+        strings.GapCase).  Values are plain Python types with None for
+        missing values, as in ModelAsDictionary, so dossiers can be passed
+        to json.dumps.
+    '''
+    from concurrent.futures import ThreadPoolExecutor
+
+    single = isinstance(species_codes, str)
+    if single:
+        species_codes = [species_codes]
+    species_codes = [strings.GapCase(x) for x in species_codes]
+    todo = [x for x in species_codes if refresh or (db, x) not in __dossierCache]
+
+    def __models():
+        # Included models for the species, with their variables
+        cursor, connection = database.ConnectDB(db)
+        sql = """SELECT mi.strSpeciesModelCode FROM tblTaxa AS t
+                 INNER JOIN tblModelInfo AS mi
+                 ON t.strUC = mi.strUC
+                 WHERE ysnIncludeSpp = 1 AND ysnIncludeSubmodel = 1
+                 AND t.strUC IN ({markers})"""
+        model_list = database.ReadSQLIn(sql, todo, connection)
+        cursor.close()
+        connection.close()
+
+        models = {}
+        for modelDict in IterModelDictionaries(
+                            db, model_list["strSpeciesModelCode"].tolist(),
+                            cache_dir, refresh=refresh):
+            models.setdefault(modelDict["SpeciesCode"], {})[
+                modelDict["ModelCode"]] = modelDict
+        return models
+
+    def __range_summary():
+        # HUC counts by season and presence
+        cursor, connection = database.ConnectDB(db)
+        sql = """SELECT strUC, intGapSeas AS season, intGapPres AS presence,
+                        COUNT(*) AS HUCs
+                 FROM dbo.tblRanges
+                 WHERE strUC IN ({markers})
+                 GROUP BY strUC, intGapSeas, intGapPres"""
+        df = database.ReadSQLIn(sql, todo, connection)
+        cursor.close()
+        connection.close()
+
+        df["season"] = df["season"].map(dictionaries.RangeCodesDict["Season"])
+        df["presence"] = df["presence"].map(
+                                dictionaries.RangeCodesDict["Presence"])
+        df = df.astype(object).where(df.notna(), None)
+        return dictionaries.DataFrameToGroupedDict(df, "strUC")
+
+    if len(todo) > 0:
+        # Run the queries at the same time
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = {
+                "TaxonInfo": pool.submit(taxonomy.GetTaxonInfoBatch, db, todo),
+                "Models": pool.submit(__models),
+                "ReviewNotes": pool.submit(ReviewNotesDictBatch, todo, db),
+                "ProcessingNotes": pool.submit(ProcessingNotesDictBatch,
+                                               todo, db),
+                "RangeEdits": pool.submit(ranges.RangeEditsDictBatch, todo,
+                                          db),
+                "RangeSummary": pool.submit(__range_summary)}
+            results = {k: v.result() for k, v in futures.items()}
+
+        # Assemble and cache the dossiers
+        empty = {"TaxonInfo": None, "Models": {}, "ReviewNotes": [],
+                 "ProcessingNotes": None, "RangeEdits": [], "RangeSummary": []}
+        for species_code in todo:
+            dossier = {"SpeciesCode": species_code}
+            for key, result in results.items():
+                dossier[key] = result.get(species_code, empty[key])
+            __dossierCache[(db, species_code)] = dossier
+
+    dossiers = {x: __dossierCache[(db, x)] for x in species_codes}
+
+    if single:
+        return dossiers[species_codes[0]]
+    return dossiers
+
+
 def SpeciesModelList(species_code : str, db : str = "GAPVert_48_2016") -> list:
     '''
     Returns a list of species-region models for a given species code.
@@ -451,6 +1380,71 @@ def SpeciesModelList(species_code : str, db : str = "GAPVert_48_2016") -> list:
 
     return model_list
 
+
+def ModelInventory(db : str = "GAPVert_48_2016") -> tuple:
+    '''
+    Returns an inventory of every included species' included region-season
+    models, from one query, along with a species x region x season
+    completeness cube.  The season and region are parsed from the model
+    codes (see strings.ParseGapCodes).  Models with codes that can't be
+    parsed are kept and counted in the cube's "invalid" column, so they
+    aren't mistaken for missing models.
+
+    Parameters
+    ----------
+    db -- The database name.
+
+    Returns
+    -------
+    inventory -- A dataframe with columns "strUC", "strSpeciesModelCode",
+        "season" (categorical: 's', 'w', or 'y'), and "intRegionCode"
+        (categorical: 1 to 6), and "ysnValidCode" (False for model codes
+        that can't be parsed).  Species without any included models have
+        one row with missing model values.
+    cube -- A dataframe of model counts with a row for each species,
+        columns for each (region, season) combination, and an
+        ("invalid", "") column of models with invalid codes; zeros mark
+        missing models.
+    '''
+    # Connect to the GAP database
+    cursor, connection = database.ConnectDB(db)
+
+    # Query the included species and their included models
+    sql = """SELECT t.strUC, mi.strSpeciesModelCode FROM tblTaxa AS t
+             LEFT JOIN tblModelInfo AS mi
+             ON t.strUC = mi.strUC AND mi.ysnIncludeSubmodel = 1
+             WHERE t.ysnIncludeSpp = 1;"""
+    inventory = pd.read_sql(sql, connection)
+    cursor.close()
+    connection.close()
+
+    # Parse the season and region from the model codes
+    codes = strings.ParseGapCodes(inventory["strSpeciesModelCode"])
+    inventory["season"] = codes["season"]
+    inventory["intRegionCode"] = codes["intRegionCode"]
+    inventory["ysnValidCode"] = codes["valid"].astype("boolean").where(
+                                    inventory["strSpeciesModelCode"].notna())
+    inventory = inventory.sort_values(["strUC", "strSpeciesModelCode"],
+                                      ignore_index=True)
+
+    # Count the models in each species, region, and season
+    cube = pd.crosstab(inventory["strUC"],
+                       [inventory["intRegionCode"], inventory["season"]],
+                       dropna=False)
+    cube = cube.reindex(inventory["strUC"].unique(), fill_value=0)
+    cube.columns = pd.MultiIndex.from_tuples(
+                        [(int(region), str(season)) 
+                         for region, season in cube.columns],
+                        names=["intRegionCode", "season"])
+
+    # Count the models whose codes couldn't be parsed
+    invalid = inventory["ysnValidCode"].eq(False).fillna(False)
+    cube[("invalid", "")] = (invalid.groupby(inventory["strUC"]).sum()
+                             .reindex(cube.index, fill_value=0).astype(int))
+
+    return inventory, cube
+
+
 # -----------------------------------------------------------------------------
 def __main():
     pass
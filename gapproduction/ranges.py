@@ -5,6 +5,14 @@ import pandas as pd
 from gapproduction import database, dictionaries
 #import geopandas as gpd
 
+__rangesColumns = ["strUC", "strHUC12RNG", "intGAPOrigin", "intGAPPres", 
+                   "intGAPRepro", "intGAPSeas", "strCompSrc"]
+
+__rangeAttributes = ["intGAPOrigin", "intGAPPres", "intGAPRepro", "intGAPSeas"]
+
+__rangeEditColumns = ["strUC", "strEditor", "dtmEditDate", "memEditSource",
+                      "memEditComments"]
+
 # def RangeShapefile(species_code : str,
 #                    seasons : list = ['summer', 'winter', 'year_round'],
 #                    output_directory : str = None,
@@ -100,6 +108,31 @@ from gapproduction import database, dictionaries
 #     return result
 
 
+def __SeasonCodes(seasons : list) -> list:
+    '''
+    Converts a list of season names (e.g., 'summer', 'Year_round') or codes
+    to a list of range season codes as strings.  Year-round ('1') is added
+    if summer or winter are included.
+    '''
+    # Get the Season code dictionary, and swap keys and values
+    season_dict = dictionaries.RangeCodesDict["Season"]
+    season_dict = {v: k for k, v in season_dict.items()}
+
+    codes = []
+    for x in seasons:
+        if isinstance(x, str) and not x.isdigit():
+            # Capitalize the name and change 'year_round' to 'year-round'
+            x = x.lower().capitalize().replace('_', '-')
+            x = season_dict[x]
+        codes.append(str(int(x)))
+
+    # Add year-round to the list if summer or winter are included
+    if ('3' in codes or '4' in codes) and '1' not in codes:
+        codes.append('1')
+
+    return codes
+
+
 def RangeEVTs_season(species_code : str, seasons : str, db : str, 
                      EVT_format : str = 'names') -> list:
     '''
@@ -120,31 +153,7 @@ def RangeEVTs_season(species_code : str, seasons : str, db : str,
     cursor, conn = database.ConnectDB(db)
 
     # CLEAN UP SEASONS --------------------------------------------------------
-    # Get the Season code dictionary, and swap keys and values
-    season_dict = dictionaries.RangeCodesDict["Season"]
-    season_dict = {v: k for k, v in season_dict.items()}
-
-    # Convert season strings to codes
-    if all(isinstance(x, str) for x in seasons): 
-        # Make first letter of seasons capitalized if they are not already, 
-        # and if not codes
-        seasons = [x.lower() for x in seasons]
-        seasons = [x.capitalize() for x in seasons]
-
-        # If 'year_round' is in the season list, change to 'year-round'
-        if 'Year_round' in seasons:
-            seasons[seasons.index('Year_round')] = 'Year-round'
-
-        # Convert to codes
-        seasons = [season_dict[x] for x in seasons]
-
-    # Make the season codes a list of strings
-    seasons = [str(x) for x in seasons]
-
-    # Add year-round to the list if summer or winter are included
-    if '3' in seasons or '4' in seasons:
-        seasons.append
-        seasons.append('1')
+    seasons = __SeasonCodes(seasons)
 
     # GET THE EVTS -----------------------------------------------------------
     if EVT_format == 'codes':
@@ -184,6 +193,223 @@ def RangeEVTs_season(species_code : str, seasons : str, db : str,
     return EVTs
 
 
+def HucEVTMatrix(db : str, cache_dir : str = None, 
+                 refresh : bool = False) -> tuple:
+    '''
+    Returns tblMapUnitHucRange as a sparse boolean HUC12 x EVT matrix, 
+    where a True value means the EVT occurs in the HUC.  The matrix is read
+    from the database once and saved to a local cache, so later calls load it
+    from disk.
+
+    Parameters
+    ----------
+    db : The name of the GAP database to query.
+    cache_dir : The root cache directory (see database.CacheDirectory).
+    refresh : Whether to rebuild the cached matrix from the database.
+        Default is False.
+
+    Returns
+    -------
+    matrix : A scipy.sparse CSR matrix of HUCs (rows) by EVTs (columns).
+    hucs : A pandas Index of the strHUC12RNG values for the rows.
+    evts : A pandas Index of the intEVT_Code values for the columns.
+    '''
+    import os
+    import numpy as np
+    from scipy import sparse
+
+    directory = database.CacheDirectory(db, cache_dir)
+    matrix_file = os.path.join(directory, "huc_evt_matrix.npz")
+    index_file = os.path.join(directory, "huc_evt_index.npz")
+
+    if refresh or not (os.path.exists(matrix_file) 
+                       and os.path.exists(index_file)):
+        # Read the HUC-EVT pairs
+        cursor, conn = database.ConnectDB(db)
+        sql = """SELECT DISTINCT strHUC12RNG, intEVT_Code
+                 FROM dbo.tblMapUnitHucRange;"""
+        df = pd.read_sql(sql, conn)
+        cursor.close()
+        conn.close()
+
+        # Build the matrix
+        rows, hucs = pd.factorize(df["strHUC12RNG"].astype(str), sort=True)
+        columns, evts = pd.factorize(df["intEVT_Code"], sort=True)
+        matrix = sparse.csr_matrix((np.ones(len(df), dtype=bool), 
+                                    (rows, columns)),
+                                   shape=(len(hucs), len(evts)))
+
+        # Save it
+        sparse.save_npz(matrix_file, matrix)
+        np.savez(index_file, hucs=np.asarray(hucs, dtype=str), 
+                 evts=np.asarray(evts, dtype=np.int64))
+
+    matrix = sparse.load_npz(matrix_file).tocsr()
+    index = np.load(index_file)
+
+    return matrix, pd.Index(index["hucs"]), pd.Index(index["evts"])
+
+
+def __SeasonHucs(seasons : list, db : str, 
+                 species_codes : list = None) -> pd.DataFrame:
+    '''
+    Returns the distinct (strUC, strHUC12RNG, intGapSeas) rows of tblRanges 
+    for a list of range season codes, filtering species on the server if a 
+    list of species codes is given.
+    '''
+    cursor, conn = database.ConnectDB(db)
+    sql = f"""SELECT DISTINCT strUC, strHUC12RNG, intGapSeas
+              FROM dbo.tblRanges
+              WHERE intGapSeas IN ({', '.join([str(int(x)) for x in seasons])})"""
+    if species_codes is None:
+        df = pd.read_sql(sql, conn)
+    else:
+        df = database.ReadSQLIn(sql + " AND strUC IN ({markers})",
+                                species_codes, conn)
+    cursor.close()
+    conn.close()
+
+    return df
+
+
+def __SpeciesEVTMatrix(df : pd.DataFrame, huc_evts, hucs : pd.Index) -> tuple:
+    '''
+    Returns a sparse boolean species x EVT matrix and the species Index for
+    a dataframe of (strUC, strHUC12RNG) rows, as the product of a species x 
+    HUC indicator matrix and the HucEVTMatrix.
+    '''
+    import numpy as np
+    from scipy import sparse
+
+    # Build a species x HUC indicator matrix, dropping HUCs without EVTs
+    columns = hucs.get_indexer(df["strHUC12RNG"].astype(str))
+    df = df[columns >= 0]
+    columns = columns[columns >= 0]
+    rows, species = pd.factorize(df["strUC"], sort=True)
+    species_hucs = sparse.csr_matrix((np.ones(len(rows), dtype=np.int32), 
+                                      (rows, columns)),
+                                     shape=(len(species), len(hucs)))
+
+    # OR the HUC rows together for each species
+    matrix = (species_hucs @ huc_evts.astype(np.int32)) > 0
+
+    return matrix.tocsr(), pd.Index(species)
+
+
+def RangeEVTMatrix(seasons : list, db : str, species_codes : list = None,
+                   cache_dir : str = None) -> tuple:
+    '''
+    Returns a sparse boolean species x EVT matrix of the EVTs that occur 
+    within each species' seasonal range.  Each row is the OR of the 
+    HucEVTMatrix rows for the HUCs in the species' range, computed for all of
+    the species at once as a sparse matrix product.
+
+    Parameters
+    ----------
+    seasons : A list of range season codes (intGapSeas) to include, e.g., 
+        [1, 4] for year-round and summer.
+    db : The name of the GAP database to query.
+    species_codes : An optional list of species codes (strUC) to limit the
+        result to.  Default is all species in tblRanges.
+    cache_dir : The root cache directory (see database.CacheDirectory).
+
+    Returns
+    -------
+    matrix : A scipy.sparse CSR matrix of species (rows) by EVTs (columns).
+    species : A pandas Index of the strUC values for the rows.
+    evts : A pandas Index of the intEVT_Code values for the columns.
+    '''
+    huc_evts, hucs, evts = HucEVTMatrix(db, cache_dir)
+
+    # Read the species' seasonal HUCs
+    df = __SeasonHucs(seasons, db, species_codes)
+    df = df[["strUC", "strHUC12RNG"]].drop_duplicates()
+
+    matrix, species = __SpeciesEVTMatrix(df, huc_evts, hucs)
+
+    return matrix, species, evts
+
+
+def RangeEVTs_seasonBatch(species_codes : list, season_sets, db : str,
+                          cache_dir : str = None) -> pd.DataFrame:
+    '''
+    Returns the EVTs within the seasonal ranges of many species for one or 
+    more sets of seasons, as a long table.  This gives the same EVTs as 
+    calling RangeEVTs_season for each species and season set, but reads 
+    tblRanges once for all of the season sets and computes each set for all
+    species at once (see RangeEVTMatrix).
+
+    Parameters
+    ----------
+    species_codes : A list of species codes (strUC), or None for all species
+        in tblRanges.
+    season_sets : A list of season lists, each like the seasons argument of
+        RangeEVTs_season, e.g., [['summer'], ['winter'], ['year-round']], or
+        a dictionary of them by label.
+    db : The name of the GAP database to query.
+    cache_dir : The root cache directory (see database.CacheDirectory).
+
+    Returns
+    -------
+    EVTs : A dataframe with columns "strUC", "season_set" (the label of the 
+        set, or the season codes in the set, e.g., "1,4"), "intEVT_Code", and
+        "strEVT_Name".  EVTs that are not in tblMapUnitDesc are left out, as
+        in RangeEVTs_season.
+    '''
+    # Get the EVT names
+    cursor, conn = database.ConnectDB(db)
+    sql = """SELECT intEVT_Code, strEVT_Name FROM dbo.tblMapUnitDesc;"""
+    names = pd.read_sql(sql, conn).set_index("intEVT_Code")["strEVT_Name"]
+    names = names.str.strip()
+    cursor.close()
+    conn.close()
+
+    # Label the season sets by their codes, unless they're labeled already
+    if not isinstance(season_sets, dict):
+        season_sets = [sorted(set(__SeasonCodes(x)), key=int) 
+                       for x in season_sets]
+        season_sets = {",".join(x): x for x in season_sets}
+    codes = {k: [int(x) for x in __SeasonCodes(v)] 
+             for k, v in season_sets.items()}
+
+    # Read the seasonal HUCs for all of the sets at once
+    huc_evts, hucs, evts = HucEVTMatrix(db, cache_dir)
+    df = __SeasonHucs(sorted(set().union(*codes.values())), db, 
+                      species_codes)
+
+    frames = []
+    for label, seasons in codes.items():
+        subset = df.loc[df["intGapSeas"].isin(seasons), 
+                        ["strUC", "strHUC12RNG"]].drop_duplicates()
+        matrix, species = __SpeciesEVTMatrix(subset, huc_evts, hucs)
+
+        # Convert the nonzero cells to rows
+        rows, columns = matrix.nonzero()
+        frames.append(pd.DataFrame({"strUC": species[rows],
+                                    "season_set": label,
+                                    "intEVT_Code": evts[columns]}))
+
+    EVTs = pd.concat(frames, ignore_index=True)
+    EVTs = EVTs[EVTs["intEVT_Code"].isin(names.index)]
+    EVTs["strEVT_Name"] = EVTs["intEVT_Code"].map(names)
+    EVTs["season_set"] = pd.Categorical(EVTs["season_set"], 
+                                        categories=list(codes))
+
+    return EVTs.sort_values(["strUC", "season_set", "strEVT_Name"], 
+                            ignore_index=True)
+
+
+def __ConnectV2(v2_database : str):
+    '''
+    Returns a read-only sqlite3 connection to a v2 range output database.
+    '''
+    import sqlite3
+    from pathlib import Path
+
+    uri = Path(v2_database).resolve().as_uri() + "?mode=ro"
+    return sqlite3.connect(uri, uri=True)
+
+
 def V2FortblRanges(v2_database : str) -> pd.DataFrame:
     '''
     Reads the simple results table from a range output database and creates a
@@ -194,6 +420,9 @@ def V2FortblRanges(v2_database : str) -> pd.DataFrame:
     NULL, but NULLs are converted to 7 ('UNKNOWN') where intGAPPres is 1. 
     intGAPRepro and intGAPOrigin are set to 7 ('UNKNOWN') for all rows.
 
+    The database is opened read-only and only the HUC, presence, and season
+    columns are read.  Season codes are derived in a single vectorized step.
+
     Additional steps are needed to insert the output dataframe into the 2016 
     database: this function does not write to the GAP databases.
 
@@ -208,76 +437,63 @@ def V2FortblRanges(v2_database : str) -> pd.DataFrame:
 
     N. Tarr 6/9/2023
     '''
-    import sqlite3
-    import pandas as pd
+    import numpy as np
 
-    year = "2015"
+    year = "2015v2"
 
     # Connect to the database
-    conn = sqlite3.connect(v2_database)
-
-    # Read in simple results as a dataframe, strHUC12RNG as a string
-    sql = """SELECT * FROM simplified_results;"""
-    df = pd.read_sql(sql, conn).astype({"strHUC12RNG": "object"})
-
-    # Set the df index to strHU12RNG
-    df.set_index("strHUC12RNG", inplace=True)
-
-    # Create a new dataframe with the same index as df and columns for 
-    # intGAPPres and intGAPSeas
-    df2 = pd.DataFrame(index=df.index, columns=["intGAPPres", "intGAPSeas"])
-
-    # Set intGAPPres to 1 where presence_2015 is 1
-    df2.loc[df["presence_2015v2"] == 1, "intGAPPres"] = 1
+    conn = __ConnectV2(v2_database)
 
     # Find which seasons are represented in the simplified results table
-    seasons = [col for col in df.columns if "presence" not in col]
-    seasons = [col for col in seasons if "strHUC12RNG" not in col]
-    seasons = tuple(set([x[:-7] for x in seasons]))
-
-    # If year_round is represented, set intGAPSeas to 1 where year_round is 1
-    if "year_round" in seasons:
-        df2.loc[df["year_round_2015v2"] == 1, "intGAPSeas"] = 1
-
-    # If a strHUC12RNG value has a 1 in both summer and winter, set intGAPSeas to 1
-    if "summer" in seasons and "winter" in seasons:
-        df2.loc[(df["summer_2015v2"] == 1) & (df["winter_2015v2"] == 1), 
-                "intGAPSeas"] = 1
-        
-    # If a strHUC12RNG value has a 1 in summer but not winter, set intGAPSeas to 4
-    if "summer" in seasons and "winter" in seasons:
-        df2.loc[(df["summer_2015v2"] == 1) & (df["winter_2015v2"] != 1), 
-                "intGAPSeas"] = 4
-        
-    # If a strHUC12RNG value has a 1 in winter but not summer, set intGAPSeas to 3
-    if "summer" in seasons and "winter" in seasons:
-        df2.loc[(df["summer_2015v2"] != 1) & (df["winter_2015v2"] == 1), 
-                "intGAPSeas"] = 3
-
-    # Set intGAPSeas to 7 where intGAPPres is 1 and intGAPSeas is NULL
-    df2.loc[(df2["intGAPPres"] == 1) & (df2["intGAPSeas"].isnull()),
-            "intGAPSeas"] = 7
-    
-    # Drop rows where everything is NULL
-    df2.dropna(how="all", inplace=True)
-
-    # Reset the index so that strHUC12RNG is a column
-    df2.reset_index(inplace=True)
+    columns = [x[1] for x in conn.execute("PRAGMA table_info(simplified_results);")]
+    seasons = [x for x in ["year_round", "summer", "winter"] 
+               if f"{x}_{year}" in columns]
+
+    # Read in only the columns that are needed, strHUC12RNG as a string
+    fields = [f"{x}_{year}" for x in ["presence"] + seasons]
+    sql = f"""SELECT CAST(strHUC12RNG AS TEXT) AS strHUC12RNG, 
+                     {', '.join(fields)} 
+              FROM simplified_results;"""
+    df = pd.read_sql(sql, conn)
 
-    # Add a column for strUC
-    gap_id = conn.execute("SELECT species_id FROM compilation_info;").fetchone()[0]
+    # Boolean masks for presence and each season that is represented
+    present = df[f"presence_{year}"].eq(1)
+    flags = {x: df[f"{x}_{year}"].eq(1) for x in seasons}
+
+    # Season conditions in order of precedence.  Where summer and winter are
+    # both represented they decide the season (both = 1, summer only = 4,
+    # winter only = 3), then year_round = 1, then 7 where present but NULL.
+    conditions, choices = [], []
+    if "summer" in flags and "winter" in flags:
+        conditions += [flags["summer"] & flags["winter"],
+                       flags["summer"] & ~flags["winter"],
+                       ~flags["summer"] & flags["winter"]]
+        choices += [1, 4, 3]
+    if "year_round" in flags:
+        conditions.append(flags["year_round"])
+        choices.append(1)
+    conditions.append(present)
+    choices.append(7)
+    season = np.select(conditions, choices, default=0)
+
+    # Build the range table, dropping rows where everything is NULL
+    df2 = pd.DataFrame({"strHUC12RNG": df["strHUC12RNG"],
+                        "intGAPPres": pd.Series(1, index=df.index, 
+                                                dtype="Int64").where(present),
+                        "intGAPSeas": pd.Series(season, index=df.index,
+                                                dtype="Int64").mask(season == 0)})
+    df2 = df2[present | (season != 0)].reset_index(drop=True)
+
+    # Add columns for strUC and strCompSrc
+    gap_id, who = conn.execute("SELECT species_id, who_ran FROM compilation_info;"
+                               ).fetchone()
     df2["strUC"] = gap_id
-
-    # Add a column for strCompSrc
-    who = conn.execute("SELECT who_ran FROM compilation_info;").fetchone()[0]
     initials = "".join([x[0] for x in who.split()])
     df2["strCompSrc"] = f"USGAP ({initials})"
 
-    # Add a column for intGAPOrigin and set it to 7
-    df2["intGAPOrigin"] = 7
-
-    # Add a column for intGAPRepro and set it to 7
-    df2["intGAPRepro"] = 7
+    # Add columns for intGAPOrigin and intGAPRepro and set them to 7
+    df2["intGAPOrigin"] = pd.Series(7, index=df2.index, dtype="Int64")
+    df2["intGAPRepro"] = pd.Series(7, index=df2.index, dtype="Int64")
 
     # Close the database connection
     conn.close()
@@ -286,6 +502,107 @@ def V2FortblRanges(v2_database : str) -> pd.DataFrame:
                 "intGAPRepro", "intGAPSeas", "strCompSrc"]] 
 
 
+def __PoolMap(function, databases : list, workers : int = None,
+              failures : dict = None):
+    '''
+    Applies a function to each v2 database with a pool of processes and 
+    yields (database, result) tuples as they complete.  Databases that raise
+    an error are reported and skipped, and their errors are added to the
+    failures dictionary, if one is given.
+    '''
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(function, x): x for x in databases}
+        for future in as_completed(futures):
+            try:
+                yield futures[future], future.result()
+            except Exception as e:
+                print(f"{futures[future]}: {e}")
+                if failures is not None:
+                    failures[futures[future]] = e
+
+
+def V2FortblRangesBatch(v2_directory : str, workers : int = None,
+                        parquet : str = None, 
+                        skip_errors : bool = False) -> pd.DataFrame:
+    '''
+    Runs V2FortblRanges on every range output database (*.sqlite) in a 
+    directory, using a pool of processes with one database per task.  The
+    results are combined into a single tblRanges-shaped dataframe or streamed
+    to a Parquet file as each database finishes.
+
+    On Windows, call this from within an "if __name__ == '__main__':" block.
+
+    Parameters
+    ----------
+    v2_directory : The directory containing the v2 output databases.
+    workers : The number of worker processes.  Default is the number of CPUs.
+    parquet : Optional path to a Parquet file to write the results to
+        (requires pyarrow).  If given, nothing is returned.  Default is None.
+        Each database's rows are written as it finishes, so the row order
+        of the file is not stable between runs; sort it by strUC and 
+        strHUC12RNG after reading it if a stable order is needed.
+    skip_errors : If False (default), a ValueError listing the databases that
+        failed is raised after the others have been processed, so that a
+        partial result isn't mistaken for a complete one.  If True, failed
+        databases are reported and left out.
+
+    Returns
+    -------
+    df : A dataframe with the columns returned by V2FortblRanges for all of
+        the databases, sorted by strUC and strHUC12RNG, or None if parquet 
+        was given.
+    '''
+    import os
+    import glob
+
+    databases = sorted(glob.glob(os.path.join(v2_directory, "*.sqlite")))
+
+    # Set up the Parquet writer, if requested
+    writer = None
+    if parquet is not None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        schema = pa.schema([("strUC", pa.string()), 
+                            ("strHUC12RNG", pa.string()),
+                            ("intGAPOrigin", pa.int64()), 
+                            ("intGAPPres", pa.int64()),
+                            ("intGAPRepro", pa.int64()), 
+                            ("intGAPSeas", pa.int64()),
+                            ("strCompSrc", pa.string())])
+        writer = pq.ParquetWriter(parquet, schema)
+
+    # Process the databases, collecting or writing results as they complete
+    frames, failures = [], {}
+    try:
+        for database_path, df in __PoolMap(V2FortblRanges, databases, workers,
+                                           failures):
+            if writer is None:
+                frames.append(df)
+            else:
+                writer.write_table(pa.Table.from_pandas(df, schema=schema,
+                                                        preserve_index=False))
+    finally:
+        if writer is not None:
+            writer.close()
+
+    if failures and not skip_errors:
+        raise ValueError(f"{len(failures)} of {len(databases)} databases "
+                         "failed: " + "; ".join(f"{os.path.basename(k)}: {v}"
+                                                for k, v in sorted(failures.items())))
+
+    if writer is not None:
+        return None
+
+    if len(frames) == 0:
+        return pd.DataFrame(columns=__rangesColumns)
+
+    # Databases finish in any order, so sort for a stable result
+    return pd.concat(frames, ignore_index=True).sort_values(
+                            ["strUC", "strHUC12RNG"], ignore_index=True)
+
+
 def V2FortblRangeEdit(db : str) -> pd.DataFrame:
     """
     Reads the compilation info table from a range output database and 
@@ -303,12 +620,8 @@ def V2FortblRangeEdit(db : str) -> pd.DataFrame:
 
     N. Tarr 5/24/2023
     """
-    import sqlite3
-    import pandas as pd
-    import datetime as dt
-
     # Connect to the database
-    conn = sqlite3.connect(db)
+    conn = __ConnectV2(db)
 
     # Read in the compilation info table as a dataframe
     sql = """SELECT * FROM compilation_info;"""
@@ -337,11 +650,610 @@ def V2FortblRangeEdit(db : str) -> pd.DataFrame:
     # Add a column with the database name
     df["memEditSource"] = db
 
+    # Close the database connection
+    conn.close()
+
     # Return the dataframe
     return df[["strUC", "strEditor", "dtmEditDate", "memEditSource",
                "memEditComments"]]
 
 
+def __IngestV2(v2_database : str) -> tuple:
+    '''
+    Returns the V2FortblRanges and V2FortblRangeEdit dataframes for one v2
+    database.  Used as the worker task for V2IngestFolder.
+    '''
+    return V2FortblRanges(v2_database), V2FortblRangeEdit(v2_database)
+
+
+def __FileHash(path : str, chunk_size : int = 2**20) -> str:
+    '''
+    Returns the SHA-256 hex digest of a file's contents.
+    '''
+    import hashlib
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def V2IngestFolder(v2_directory : str, manifest : str = None,
+                   workers : int = None, force : bool = False,
+                   skip_errors : bool = False) -> tuple:
+    '''
+    Incrementally reads a folder of v2 range output databases (*.sqlite) with
+    V2FortblRanges and V2FortblRangeEdit, processing only databases that are
+    new or have changed since the last run.
+
+    A JSON manifest records each database's size, modification time, SHA-256
+    content hash, and the run_date and who_ran values from compilation_info.
+    Files whose size and modification time are unchanged are skipped without
+    hashing; otherwise, files are only reprocessed if their hash changed.
+
+    New or changed databases are not recorded in the manifest until they have
+    been loaded, so a failed load is retried on the next run.  Pass the
+    returned pending entries to CommitV2Manifest after loading the dataframes
+    (e.g., with UpsertSpeciesRange and LoadtblRangeEdit).
+
+    Parameters
+    ----------
+    v2_directory : The directory containing the v2 output databases.
+    manifest : Path to the JSON manifest.  Default is 
+        "v2_ingest_manifest.json" in v2_directory.
+    workers : The number of worker processes.  Default is the number of CPUs.
+    force : If True, process every database regardless of the manifest.
+        Default is False.
+    skip_errors : If False (default), a ValueError listing the databases that
+        failed is raised after the others have been processed.  If True,
+        failed databases are reported and left out of the results and 
+        pending entries, so they are retried on the next run.
+
+    Returns
+    -------
+    ranges_df : A tblRanges-shaped dataframe (see V2FortblRanges) for the new
+        or changed databases.
+    edits_df : A tblRangeEdit-shaped dataframe (see V2FortblRangeEdit) for 
+        the new or changed databases.
+    pending : The manifest entries of the new or changed databases, for 
+        CommitV2Manifest.
+    '''
+    import os
+    import glob
+
+    if manifest is None:
+        manifest = os.path.join(v2_directory, "v2_ingest_manifest.json")
+
+    # Read the manifest from the previous run
+    entries = {} if force else __ReadV2Manifest(manifest)
+    touched = {}
+
+    # FIND NEW OR CHANGED DATABASES -------------------------------------------
+    databases = sorted(glob.glob(os.path.join(v2_directory, "*.sqlite")))
+    todo = {}
+    for path in databases:
+        name = os.path.basename(path)
+        stat = os.stat(path)
+        entry = entries.get(name)
+
+        # Unchanged size and modification time means an unchanged file
+        if (entry is not None and entry["size"] == stat.st_size 
+                and entry["mtime"] == stat.st_mtime):
+            continue
+
+        # Otherwise compare the content hash
+        sha256 = __FileHash(path)
+        if entry is not None and entry["sha256"] == sha256:
+            entry.update({"size": stat.st_size, "mtime": stat.st_mtime})
+            touched[name] = entry
+            continue
+
+        todo[path] = {"size": stat.st_size, "mtime": stat.st_mtime, 
+                      "sha256": sha256}
+
+    # PROCESS THEM ------------------------------------------------------------
+    range_frames, edit_frames, pending = [], [], {}
+    failures = {}
+    for path, (ranges_df, edits_df) in __PoolMap(__IngestV2, list(todo), 
+                                                 workers, failures):
+        range_frames.append(ranges_df)
+        edit_frames.append(edits_df)
+
+        entry = todo[path]
+        entry["species_id"] = edits_df["strUC"].iloc[0]
+        entry["who_ran"] = edits_df["strEditor"].iloc[0]
+        entry["run_date"] = edits_df["dtmEditDate"].iloc[0]
+        pending[os.path.basename(path)] = entry
+
+    # Record the new modification times of unchanged databases
+    if touched:
+        CommitV2Manifest(touched, manifest)
+
+    if failures and not skip_errors:
+        raise ValueError(f"{len(failures)} of {len(todo)} databases "
+                         "failed: " + "; ".join(f"{os.path.basename(k)}: {v}"
+                                                for k, v in sorted(failures.items())))
+
+    ranges_df = (pd.concat(range_frames, ignore_index=True) if range_frames
+                 else pd.DataFrame(columns=__rangesColumns))
+    edits_df = (pd.concat(edit_frames, ignore_index=True) if edit_frames
+                else pd.DataFrame(columns=__rangeEditColumns))
+
+    return ranges_df, edits_df, pending
+
+
+def __ReadV2Manifest(manifest : str) -> dict:
+    '''
+    Returns the entries of a V2IngestFolder manifest, or an empty dictionary
+    if it doesn't exist yet.
+    '''
+    import os
+    import json
+
+    if not os.path.exists(manifest):
+        return {}
+    with open(manifest) as f:
+        return json.load(f)
+
+
+def CommitV2Manifest(pending : dict, manifest : str) -> None:
+    '''
+    Records databases returned as pending by V2IngestFolder in its manifest,
+    so they are skipped on the next run.  Call this only after their 
+    dataframes have been loaded successfully.
+
+    Parameters
+    ----------
+    pending : The pending manifest entries returned by V2IngestFolder, or a
+        subset of them for the databases that were loaded.
+    manifest : Path to the JSON manifest (the same one given to
+        V2IngestFolder, by default "v2_ingest_manifest.json" in the v2 
+        directory).
+
+    Returns
+    -------
+    None
+    '''
+    import os
+    import json
+
+    entries = __ReadV2Manifest(manifest)
+    entries.update(pending)
+
+    # Write to a temporary file first so a failed write can't lose entries
+    with open(manifest + ".tmp", "w") as f:
+        json.dump(entries, f, indent=2, sort_keys=True)
+    os.replace(manifest + ".tmp", manifest)
+
+    return None
+
+
+def RangeFingerprints(db : str, server_side : bool = True,
+                      chunksize : int = 500000) -> pd.DataFrame:
+    '''
+    Returns an order-independent fingerprint of each species' range in
+    tblRanges, computed from its (HUC, origin, presence, reproduction, season)
+    rows.  Two ranges with the same rows get the same fingerprint regardless
+    of row order, so fingerprints can be compared between databases to find
+    the species whose ranges differ.
+
+    Fingerprints are only comparable when computed with the same method.
+
+    Parameters
+    ----------
+    db : The name of the GAP database to query.
+    server_side : If True (default), fingerprints are aggregated on the
+        server from BINARY_CHECKSUM values, so only one row per species is
+        returned.  If False, all range rows are read in one streaming pass of
+        chunksize rows and hashed locally with 64-bit row hashes, which is 
+        slower but much less prone to collisions.
+    chunksize : The number of rows per chunk when server_side is False.
+
+    Returns
+    -------
+    fingerprints : A dataframe indexed by strUC with columns "intRows" and
+        "strFingerprint".
+    '''
+    cursor, connection = database.ConnectDB(db)
+
+    if server_side:
+        sql = """SELECT strUC, COUNT(*) AS intRows,
+                        SUM(CAST(BINARY_CHECKSUM(strHUC12RNG, intGapOrigin, 
+                                                 intGapPres, intGapRepro, 
+                                                 intGapSeas) AS BIGINT)) AS s,
+                        CHECKSUM_AGG(BINARY_CHECKSUM(strHUC12RNG, intGapOrigin,
+                                                     intGapPres, intGapRepro,
+                                                     intGapSeas)) AS x
+                 FROM dbo.tblRanges
+                 GROUP BY strUC;"""
+        df = pd.read_sql(sql, connection).set_index("strUC")
+        df["strFingerprint"] = (df["intRows"].astype(str) + "-" 
+                                + df["s"].astype(str) + "-" 
+                                + df["x"].astype(str))
+
+    else:
+        sql = """SELECT strUC, strHUC12RNG, 
+                        intGapOrigin AS intGAPOrigin, intGapPres AS intGAPPres,
+                        intGapRepro AS intGAPRepro, intGapSeas AS intGAPSeas
+                 FROM dbo.tblRanges;"""
+        totals = []
+        for chunk in pd.read_sql(sql, connection, chunksize=chunksize):
+            chunk = chunk.astype({x: "Int64" for x in __rangeAttributes})
+            chunk["strHUC12RNG"] = chunk["strHUC12RNG"].astype(str)
+            hashes = pd.util.hash_pandas_object(
+                        chunk[["strHUC12RNG"] + __rangeAttributes], index=False)
+
+            # Sum the two 32-bit halves of each hash so the totals can't
+            # overflow, then carry them over to the next chunk
+            totals.append(pd.DataFrame({"strUC": chunk["strUC"].values,
+                                        "intRows": 1,
+                                        "hi": (hashes.values >> 32).astype("int64"),
+                                        "lo": (hashes.values & 0xFFFFFFFF).astype("int64")})
+                            .groupby("strUC").sum())
+            totals = [pd.concat(totals).groupby(level=0).sum()]
+
+        df = totals[0] if totals else pd.DataFrame(columns=["intRows", "hi", "lo"])
+        df["strFingerprint"] = (df["intRows"].astype(str) + "-" 
+                                + df["hi"].map("{:x}".format) + "-" 
+                                + df["lo"].map("{:x}".format))
+
+    cursor.close()
+    connection.close()
+
+    return df[["intRows", "strFingerprint"]]
+
+
+def RangeCatalogDiff(db1 : str, db2 : str, detailed : bool = True,
+                     server_side : bool = True) -> tuple:
+    '''
+    Finds the species whose ranges differ between two GAP databases (e.g., 
+    GapVert_48_2001 and GapVert_48_2016) by comparing range fingerprints, 
+    then computes HUC-level diffs only for species whose fingerprints differ.
+
+    Parameters
+    ----------
+    db1 : The name of the first (older) GAP database.
+    db2 : The name of the second (newer) GAP database.
+    detailed : Whether to compute HUC-level diffs for the changed species.
+        Default is True.
+    server_side : Passed to RangeFingerprints.  Default is True.
+
+    Returns
+    -------
+    summary : A dataframe indexed by strUC with the row counts and 
+        fingerprints from each database ("_1" and "_2") and a "status" 
+        column: "same", "changed", "only_in_db1", or "only_in_db2".
+    details : A dataframe of HUC-level differences for the changed species,
+        as in PreviewV2Range with "_old" from db1 and "_new" from db2 plus a
+        "strUC" column, or None if detailed is False.
+    '''
+    import numpy as np
+
+    # Compare fingerprints
+    summary = RangeFingerprints(db1, server_side).join(
+                RangeFingerprints(db2, server_side), how="outer", 
+                lsuffix="_1", rsuffix="_2")
+    summary["status"] = np.select(
+        [summary["strFingerprint_2"].isna(), summary["strFingerprint_1"].isna(),
+         summary["strFingerprint_1"] != summary["strFingerprint_2"]],
+        ["only_in_db1", "only_in_db2", "changed"], default="same")
+
+    if not detailed:
+        return summary, None
+
+    # Diff the changed species' ranges
+    changed = summary.index[summary["status"] == "changed"]
+    cursor1, connection1 = database.ConnectDB(db1)
+    cursor2, connection2 = database.ConnectDB(db2)
+    frames = []
+    for species_code in changed:
+        diff = __DiffRange(__CurrentRange(species_code, connection2),
+                           __CurrentRange(species_code, connection1))
+        diff = diff[diff["change"] != "unchanged"]
+        diff.insert(0, "strUC", species_code)
+        frames.append(diff)
+    for x in [cursor1, connection1, cursor2, connection2]:
+        x.close()
+
+    details = pd.concat(frames, ignore_index=True) if frames else None
+
+    return summary, details
+
+
+def LoadtblRanges(df : pd.DataFrame, db : str, 
+                  batch_size : int = 10000) -> int:
+    '''
+    Bulk loads range rows, such as the output of V2FortblRanges, into 
+    tblRanges.  The rows are first inserted into a temporary staging table in
+    batches with fast_executemany.  Then, in a single transaction, the 
+    existing tblRanges rows for each species in the dataframe are deleted and
+    replaced with the staged rows.  If anything fails, the swap is rolled back
+    and tblRanges is unchanged.
+
+    Parameters
+    ----------
+    df : A dataframe with the columns returned by V2FortblRanges.
+    db : The name of the GAP database to load into.
+    batch_size : The number of rows to send to the staging table per batch.
+        Default is 10000.
+
+    Returns
+    -------
+    count : The number of rows loaded into tblRanges.
+    '''
+    columns = ", ".join(__rangesColumns)
+
+    # Connect to the GAP database
+    cursor, connection = database.ConnectDB_pyodbc(db)
+
+    try:
+        # Stage the rows in a temporary table shaped like tblRanges
+        cursor.execute(f"""SELECT TOP 0 {columns} INTO #stgRanges 
+                           FROM dbo.tblRanges;""")
+        count = database.BulkInsert(cursor, "#stgRanges", df[__rangesColumns],
+                                    batch_size=batch_size)
+
+        # Swap the staged rows in for the species' current rows
+        cursor.execute("""DELETE FROM dbo.tblRanges 
+                          WHERE strUC IN (SELECT DISTINCT strUC FROM #stgRanges);""")
+        cursor.execute(f"""INSERT INTO dbo.tblRanges ({columns})
+                           SELECT {columns} FROM #stgRanges;""")
+        connection.commit()
+
+    except Exception as e:
+        connection.rollback()
+        print(e)
+        raise
+
+    finally:
+        cursor.close()
+        connection.close()
+
+    return count
+
+
+def __CurrentRange(species_code : str, connection) -> pd.DataFrame:
+    '''
+    Returns a species' current tblRanges rows with the column names used by
+    V2FortblRanges.
+    '''
+    sql = """SELECT strUC, strHUC12RNG, 
+                    intGapOrigin AS intGAPOrigin, intGapPres AS intGAPPres,
+                    intGapRepro AS intGAPRepro, intGapSeas AS intGAPSeas,
+                    strCompSrc
+             FROM dbo.tblRanges
+             WHERE strUC = ?;"""
+    df = pd.read_sql(sql, connection, params=[species_code])
+    return df.astype({x: "Int64" for x in __rangeAttributes})
+
+
+def __Differs(old : pd.Series, new : pd.Series):
+    '''
+    Returns a boolean array that is True where two integer columns differ.
+    Values differ unless they are equal or both NULL.
+    '''
+    old = old.astype("Int64")
+    new = new.astype("Int64")
+    same = old.eq(new).fillna(False) | (old.isna() & new.isna())
+    return ~same.to_numpy(dtype=bool)
+
+
+def __DiffRange(new : pd.DataFrame, current : pd.DataFrame) -> pd.DataFrame:
+    '''
+    Compares a species' new range rows with its current rows in a single 
+    outer merge on strHUC12RNG.  Returns one row per HUC with the old and new
+    attribute values and a categorical "change" column: "insert" (HUC only
+    in the new range), "delete" (HUC only in the current range), "update" 
+    (any attribute differs), or "unchanged".
+    '''
+    import numpy as np
+
+    merged = current[["strHUC12RNG"] + __rangeAttributes].merge(
+                new[["strHUC12RNG"] + __rangeAttributes + ["strCompSrc"]],
+                on="strHUC12RNG", how="outer", suffixes=("_old", "_new"), 
+                indicator=True)
+
+    # A HUC is updated if any of its attributes differ
+    differs = np.zeros(len(merged), dtype=bool)
+    for x in __rangeAttributes:
+        differs |= __Differs(merged[x + "_old"], merged[x + "_new"])
+
+    change = np.select([merged["_merge"] == "right_only",
+                        merged["_merge"] == "left_only",
+                        differs],
+                       ["insert", "delete", "update"], default="unchanged")
+    merged["change"] = pd.Categorical(change, categories=["insert", "delete", 
+                                                          "update", "unchanged"])
+
+    return merged.drop(columns="_merge")
+
+
+def PreviewV2Range(v2_database : str, db : str) -> tuple:
+    '''
+    Compares the range in a v2 range output database with the species' 
+    current range in tblRanges without writing anything, so that reviewers
+    can see which HUCs would be added, removed, or changed.
+
+    Parameters
+    ----------
+    v2_database : The path to the v2 range output database.
+    db : The name of the GAP database to compare against.
+
+    Returns
+    -------
+    diff : A dataframe with one row per HUC in either range and columns 
+        "strHUC12RNG", the old ("_old") and new ("_new") values of 
+        "intGAPOrigin", "intGAPPres", "intGAPRepro", and "intGAPSeas", 
+        "strCompSrc", "change" (categorical: "insert", "delete", "update", or
+        "unchanged"), "season_changed" and "presence_changed" (booleans).
+    summary : A dataframe of HUC counts by season code (rows, the new season
+        or the old season for deleted HUCs) and change (columns).
+    '''
+    # Read the v2 range and the current range
+    new = V2FortblRanges(v2_database)
+    cursor, connection = database.ConnectDB(db)
+    current = __CurrentRange(new["strUC"].iloc[0], connection)
+    cursor.close()
+    connection.close()
+
+    # Compare them
+    diff = __DiffRange(new, current)
+    updated = (diff["change"] == "update").to_numpy()
+    diff["season_changed"] = updated & __Differs(diff["intGAPSeas_old"],
+                                                 diff["intGAPSeas_new"])
+    diff["presence_changed"] = updated & __Differs(diff["intGAPPres_old"],
+                                                   diff["intGAPPres_new"])
+
+    # Summarize the changes by season code
+    season = diff["intGAPSeas_new"].fillna(diff["intGAPSeas_old"])
+    summary = pd.crosstab(season.rename("intGAPSeas"), diff["change"],
+                          dropna=False)
+
+    return diff, summary
+
+
+def UpsertSpeciesRange(df : pd.DataFrame, db : str, 
+                       batch_size : int = 10000) -> dict:
+    '''
+    Replaces a species' range in tblRanges with a new range, such as the 
+    output of V2FortblRanges, by writing only the HUCs that changed.  The new
+    rows are compared with the species' current rows in one merge on HUC, and
+    only the inserts, deletes, and attribute updates are staged and applied
+    in a single transaction.  If anything fails, the transaction is rolled
+    back and tblRanges is unchanged.
+
+    Parameters
+    ----------
+    df : A dataframe with the columns returned by V2FortblRanges for a 
+        single species.
+    db : The name of the GAP database to write to.
+    batch_size : The number of rows to send to the staging table per batch.
+        Default is 10000.
+
+    Returns
+    -------
+    counts : A dictionary with the number of HUCs inserted, deleted, updated,
+        and unchanged.
+    '''
+    species = df["strUC"].unique()
+    if len(species) != 1:
+        raise ValueError("UpsertSpeciesRange takes the range of one species; "
+                         f"got {len(species)}")
+    species_code = species[0]
+
+    # Connect to the GAP database
+    cursor, connection = database.ConnectDB_pyodbc(db)
+
+    try:
+        # Find the HUCs that changed
+        diff = __DiffRange(df, __CurrentRange(species_code, connection))
+        counts = diff["change"].value_counts().to_dict()
+        delta = diff[diff["change"] != "unchanged"]
+
+        # Stage the changed HUCs, with the new attribute values
+        staged = pd.DataFrame({"strUC": species_code,
+                               "strHUC12RNG": delta["strHUC12RNG"]})
+        for x in __rangeAttributes:
+            staged[x] = delta[x + "_new"]
+        staged["strCompSrc"] = delta["strCompSrc"]
+        staged["strChange"] = delta["change"].astype(str)
+
+        columns = ", ".join(__rangesColumns)
+        cursor.execute(f"""SELECT TOP 0 {columns} INTO #stgRangeDelta 
+                           FROM dbo.tblRanges;""")
+        cursor.execute("ALTER TABLE #stgRangeDelta ADD strChange varchar(9);")
+        database.BulkInsert(cursor, "#stgRangeDelta", staged, 
+                            batch_size=batch_size)
+
+        # Apply the deletes, updates, and inserts
+        cursor.execute("""DELETE r FROM dbo.tblRanges AS r
+                          INNER JOIN #stgRangeDelta AS s
+                          ON r.strUC = s.strUC AND r.strHUC12RNG = s.strHUC12RNG
+                          WHERE s.strChange = 'delete';""")
+        cursor.execute("""UPDATE r 
+                          SET r.intGapOrigin = s.intGAPOrigin, 
+                              r.intGapPres = s.intGAPPres,
+                              r.intGapRepro = s.intGAPRepro, 
+                              r.intGapSeas = s.intGAPSeas,
+                              r.strCompSrc = s.strCompSrc
+                          FROM dbo.tblRanges AS r
+                          INNER JOIN #stgRangeDelta AS s
+                          ON r.strUC = s.strUC AND r.strHUC12RNG = s.strHUC12RNG
+                          WHERE s.strChange = 'update';""")
+        cursor.execute(f"""INSERT INTO dbo.tblRanges ({columns})
+                           SELECT {columns} FROM #stgRangeDelta
+                           WHERE strChange = 'insert';""")
+        connection.commit()
+
+    except Exception as e:
+        connection.rollback()
+        print(e)
+        raise
+
+    finally:
+        cursor.close()
+        connection.close()
+
+    return {x: counts.get(x, 0) for x in ["insert", "delete", "update", 
+                                          "unchanged"]}
+
+
+def LoadtblRangeEdit(df : pd.DataFrame, db : str) -> int:
+    '''
+    Bulk loads range edit records, such as the output of V2FortblRangeEdit,
+    into tblRangeEdit in one transaction.  Records that are already in 
+    tblRangeEdit (same strUC, strEditor, and dtmEditDate, where missing
+    values match each other) are skipped, so reloads add nothing.
+
+    Parameters
+    ----------
+    df : A dataframe with the columns returned by V2FortblRangeEdit.
+    db : The name of the GAP database to load into.
+
+    Returns
+    -------
+    count : The number of records inserted into tblRangeEdit.
+    '''
+    columns = ", ".join(__rangeEditColumns)
+
+    # Connect to the GAP database
+    cursor, connection = database.ConnectDB_pyodbc(db)
+
+    try:
+        # Stage the records in a temporary table shaped like tblRangeEdit
+        cursor.execute(f"""SELECT TOP 0 {columns} INTO #stgRangeEdit
+                           FROM dbo.tblRangeEdit;""")
+        database.BulkInsert(cursor, "#stgRangeEdit", df[__rangeEditColumns],
+                            commit=False)
+
+        # Insert the staged records that are not already in tblRangeEdit
+        cursor.execute(f"""INSERT INTO dbo.tblRangeEdit ({columns})
+                           SELECT {columns} FROM #stgRangeEdit AS s
+                           WHERE NOT EXISTS (
+                               SELECT * FROM dbo.tblRangeEdit AS e
+                               WHERE e.strUC = s.strUC 
+                               AND (e.strEditor = s.strEditor
+                                    OR (e.strEditor IS NULL 
+                                        AND s.strEditor IS NULL))
+                               AND (e.dtmEditDate = s.dtmEditDate
+                                    OR (e.dtmEditDate IS NULL 
+                                        AND s.dtmEditDate IS NULL)));""")
+        count = cursor.rowcount
+        connection.commit()
+
+    except Exception as e:
+        connection.rollback()
+        print(e)
+        raise
+
+    finally:
+        cursor.close()
+        connection.close()
+
+    return count
+
+
 def RangeEditsDict(species_code : str, db : str = "GapVert_48_2016") -> dict: 
     '''
     Returns a dictionary of range edits for a given species code.
@@ -376,6 +1288,46 @@ def RangeEditsDict(species_code : str, db : str = "GapVert_48_2016") -> dict:
 
     return range_edits
 
+
+def RangeEditsDictBatch(species_codes = "all",
+                        db : str = "GapVert_48_2016") -> dict:
+    '''
+    Returns the range edits (see RangeEditsDict) for many species, read from
+    tblRangeEdit with one query.
+
+    Parameters
+    ----------
+    species_codes -- A list of species' unique GAP IDs ("strUC"), or "all".
+    db -- The database to connect to.  Default is "GapVert_48_2016".
+
+    Returns
+    -------
+    range_edits -- A dictionary with species codes as keys and lists of
+        dictionaries of the species' range edits as values.
+    '''
+    # Connect to the GAP database
+    cursor, connection = database.ConnectDB(db)
+
+    # Query the range edits
+    sql = """SELECT strUC, memEditComments AS range_edit_comment,
+                    dtmEditDate AS edit_date,
+                    strEditor AS editor
+             FROM tblRangeEdit"""
+    if isinstance(species_codes, str) and species_codes == "all":
+        df = pd.read_sql(sql, connection)
+    else:
+        df = database.ReadSQLIn(sql + " WHERE strUC IN ({markers})",
+                                species_codes, connection)
+    cursor.close()
+    connection.close()
+
+    # Order by date, reformat dtmEditDate values to remove the time
+    # component, and group by species
+    df = df.sort_values(["strUC", "edit_date"], kind="stable")
+    df = dictionaries.FormatDates(df, ["edit_date"])
+
+    return dictionaries.DataFrameToGroupedDict(df, "strUC")
+
 # -----------------------------------------------------------------------------
 def __main():
     pass
@@ -0,0 +1,187 @@
+"""
+This module builds and searches a local full-text index of the free-text
+fields in the GAP databases (review notes, range edit comments, habitat model
+notes, and citations), so that they can be searched without scanning them on
+the server with LIKE.
+"""
+from gapproduction import database, citations
+import pandas as pd
+
+# Queries for the text that is indexed, by source.  Each returns the text and
+# the species code, model code, and reference code that it belongs to.
+# Reference codes reserved by citations.AllocateStrRefCodes are left out.
+__sources = {"review": """SELECT strUC, NULL AS strSpeciesModelCode,
+                                 NULL AS strRefCode, memReviewText AS text
+                          FROM dbo.tblSppReview
+                          WHERE memReviewText IS NOT NULL;""",
+             "range_edit": """SELECT strUC, NULL AS strSpeciesModelCode,
+                                     NULL AS strRefCode,
+                                     memEditComments AS text
+                              FROM dbo.tblRangeEdit
+                              WHERE memEditComments IS NOT NULL;""",
+             "model": """SELECT LEFT(strSpeciesModelCode, 6) AS strUC,
+                                strSpeciesModelCode, NULL AS strRefCode,
+                                memHMNotes AS text
+                         FROM dbo.tblModelAncillary
+                         WHERE memHMNotes IS NOT NULL;""",
+             "citation": f"""SELECT NULL AS strUC, NULL AS strSpeciesModelCode,
+                                    strRefCode, memCitation AS text
+                             FROM dbo.tblCitations
+                             WHERE memCitation IS NOT NULL
+                             AND memCitation <> '{citations.__reservedCitation}';"""}
+
+__columns = ["strUC", "strSpeciesModelCode", "strRefCode", "text"]
+
+
+def __IndexPath(db : str, index_path : str = None) -> str:
+    '''
+    Returns the path of the index database, which by default is in the
+    database's cache directory.
+    '''
+    import os
+
+    if index_path is None:
+        index_path = os.path.join(database.CacheDirectory(db),
+                                  "text_index.sqlite")
+    return index_path
+
+
+def BuildTextIndex(db : str, index_path : str = None,
+                   sources : list = None) -> dict:
+    '''
+    Builds or refreshes a local SQLite FTS5 full-text index of memReviewText
+    (tblSppReview), memEditComments (tblRangeEdit), memHMNotes
+    (tblModelAncillary), and memCitation (tblCitations).
+
+    Each row is identified by a hash of its source, codes, and text, so a
+    refresh only adds rows that are new or changed and removes rows that no
+    longer exist; unchanged rows are not reindexed.
+
+    Parameters
+    ----------
+    db : The name of the GAP database to index.
+    index_path : The path of the SQLite index file.  Default is
+        "text_index.sqlite" in the database's cache directory (see
+        database.CacheDirectory).
+    sources : An optional list of sources to refresh: "review", "range_edit",
+        "model", and/or "citation".  Default is all of them.
+
+    Returns
+    -------
+    counts : A dictionary with the number of rows "added", "removed", and
+        "unchanged".
+    '''
+    import sqlite3
+    import hashlib
+
+    if sources is None:
+        sources = list(__sources)
+
+    index = sqlite3.connect(__IndexPath(db, index_path))
+    index.executescript("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS docs USING fts5(
+            text, source UNINDEXED, strUC UNINDEXED,
+            strSpeciesModelCode UNINDEXED, strRefCode UNINDEXED,
+            tokenize = 'porter unicode61');
+        CREATE TABLE IF NOT EXISTS doc_hashes (
+            hash TEXT PRIMARY KEY, source TEXT, docid INTEGER);""")
+
+    # Connect to the GAP database
+    cursor, connection = database.ConnectDB(db)
+
+    counts = {"added": 0, "removed": 0, "unchanged": 0}
+    try:
+        for source in sources:
+            # Hash the current rows
+            df = pd.read_sql(__sources[source], connection)
+            df = df.astype(object).where(df.notna(), None)
+            df["hash"] = [hashlib.sha1("\x1f".join([source] + [str(x) for x in row])
+                                       .encode("utf-8")).hexdigest()
+                          for row in df[__columns].itertuples(index=False)]
+            df = df.drop_duplicates("hash")
+
+            # Compare them with the indexed rows
+            indexed = dict(index.execute("""SELECT hash, docid FROM doc_hashes
+                                            WHERE source = ?;""", [source]))
+            new = df[~df["hash"].isin(indexed)]
+            gone = set(indexed) - set(df["hash"])
+
+            # Remove rows that no longer exist
+            index.executemany("DELETE FROM docs WHERE rowid = ?;",
+                              [(indexed[x],) for x in gone])
+            index.executemany("DELETE FROM doc_hashes WHERE hash = ?;",
+                              [(x,) for x in gone])
+
+            # Add new and changed rows
+            for row in new.itertuples(index=False):
+                docid = index.execute("""INSERT INTO docs (text, source, strUC,
+                                             strSpeciesModelCode, strRefCode)
+                                         VALUES (?, ?, ?, ?, ?);""",
+                                      [row.text, source, row.strUC,
+                                       row.strSpeciesModelCode,
+                                       row.strRefCode]).lastrowid
+                index.execute("""INSERT INTO doc_hashes (hash, source, docid)
+                                 VALUES (?, ?, ?);""", [row.hash, source, docid])
+            index.commit()
+
+            counts["added"] += len(new)
+            counts["removed"] += len(gone)
+            counts["unchanged"] += len(df) - len(new)
+
+    finally:
+        cursor.close()
+        connection.close()
+        index.close()
+
+    return counts
+
+
+def SearchText(query : str, db : str, index_path : str = None,
+               sources : list = None, limit : int = 50) -> pd.DataFrame:
+    '''
+    Searches the local full-text index built by BuildTextIndex and returns
+    the best matches first.
+
+    Parameters
+    ----------
+    query : An FTS5 query, e.g., 'riparian', 'elevation AND winter', or
+        '"forest interior"'.
+    db : The name of the GAP database that was indexed.
+    index_path : The path of the SQLite index file (see BuildTextIndex).
+    sources : An optional list of sources to search: "review", "range_edit",
+        "model", and/or "citation".  Default is all of them.
+    limit : The maximum number of hits to return.  Default is 50.
+
+    Returns
+    -------
+    hits : A dataframe with columns "source", "strUC", "strSpeciesModelCode",
+        "strRefCode", "snippet" (the matching text with matches in [brackets]),
+        and "rank" (lower is better).
+    '''
+    import sqlite3
+
+    sql = """SELECT source, strUC, strSpeciesModelCode, strRefCode,
+                    snippet(docs, 0, '[', ']', '...', 16) AS snippet,
+                    bm25(docs) AS rank
+             FROM docs
+             WHERE docs MATCH ?"""
+    params = [query]
+    if sources is not None:
+        sql += f" AND source IN ({', '.join(['?'] * len(sources))})"
+        params += list(sources)
+    sql += " ORDER BY rank LIMIT ?;"
+    params.append(limit)
+
+    index = sqlite3.connect(__IndexPath(db, index_path))
+    hits = pd.read_sql(sql, index, params=params)
+    index.close()
+
+    return hits
+
+
+# -----------------------------------------------------------------------------
+def __main():
+    pass
+
+if __name__ == '__main__':
+    __main()
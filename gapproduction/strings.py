@@ -1,5 +1,9 @@
 import re
-import collections
+import collections.abc
+import functools
+import numpy as np
+import pandas as pd
+from gapproduction import dictionaries
 
 def GapCase(spCode : str) -> str:
     '''
@@ -86,15 +90,106 @@ def RemoveRepeats(inText, searchString):
     return inText
 
 
+@functools.lru_cache(maxsize=256)
+def __WildcardPattern(searchString, regex):
+    '''
+    A private function that should only be called from other
+        functions within this module.  Returns the compiled regular expression
+        for a search string, so each search string is compiled only once.
+    '''
+    # Convert the search string into a regular expression, beginning it with a
+    # string begin character, replacing asterisks with the code to search for
+    # any number of characters and ending with a string end character.
+    return re.compile('^' + searchString.replace('*', regex) + '$')
+
+
+def __LiteralEnds(searchString):
+    '''
+    A private function that should only be called from other
+        functions within this module.  Returns the literal characters at the
+        start and end of a search string, before the first and after the last
+        wildcard or regular expression character.
+    '''
+    special = set('*.^$+?{}[]\\|()')
+    if '|' in searchString:
+        return '', ''
+    prefix = ''
+    for c in searchString:
+        if c in special:
+            # Quantifiers make the character before them optional
+            if c in '?{+':
+                prefix = prefix[:-1]
+            break
+        prefix += c
+    if prefix == searchString:
+        return prefix, prefix
+    suffix = ''
+    for c in reversed(searchString):
+        if c in special:
+            break
+        suffix = c + suffix
+    # An escaped character isn't literal
+    if searchString[:len(searchString) - len(suffix)].endswith('\\'):
+        suffix = suffix[1:]
+    return prefix, suffix
+
+
+def FilterIndex(inputList):
+    '''
+    (list) -> dict
+
+    Returns an index of a list of strings, such as all model codes, for
+        repeated FilterList searches.  The index keeps the lowercase strings
+        sorted from the start and from the end, so that the literal
+        characters at the start and end of a search string narrow the
+        candidates with a binary search before the regular expression is
+        applied.
+
+    Argument:
+    inputList -- A list, pandas Series, or numpy array of strings.  Items that
+        are not strings are left out.
+
+    Example:
+    >>> index = FilterIndex(['bbaeax', 'mnarox', 'mnarop', 'xflurb'])
+    >>> FilterList(index, 'mn*')
+    ['mnarox', 'mnarop']
+    '''
+    items = np.array([i for i in inputList if isinstance(i, str)], dtype=object)
+    lower = np.array([i.lower() for i in items], dtype=str)
+    backward = np.array([i[::-1] for i in lower], dtype=str)
+
+    prefixOrder = np.argsort(lower, kind='stable')
+    suffixOrder = np.argsort(backward, kind='stable')
+
+    return {'items': items, 'lower': lower,
+            'prefix_order': prefixOrder, 'prefix_keys': lower[prefixOrder],
+            'suffix_order': suffixOrder, 'suffix_keys': backward[suffixOrder]}
+
+
+def __IndexRange(keys, order, start):
+    '''
+    A private function that should only be called from other
+        functions within this module.  Returns the positions of the index keys
+        that begin with the given characters.
+    '''
+    lo = np.searchsorted(keys, start, side='left')
+    hi = np.searchsorted(keys, start + chr(0x10FFFF), side='left')
+    return order[lo:hi]
+
+
 def FilterList(inputList, searchString, regex=r'[\s\S]*'):
     '''
     (list, string) -> list
 
     Returns a list containing all items from the input list that contain the
-        input search string.
+        input search string.  The search string is compiled once, and a pandas
+        Series or numpy array is filtered with vectorized string methods.
 
     Arguments:
-    list -- A list of strings to be filtered.
+    list -- A list of strings to be filtered.  It may also be a pandas Series
+        or numpy array, in which case the filtered Series or array is
+        returned, or an index from FilterIndex for fast repeated searches of
+        the same large list, in which case a list is returned.
     searchString -- The string to search for in the input list; asterisks are
         treated as one or more characters.
     regex -- An optional parameter to set your own regular expression to replace
@@ -118,28 +213,109 @@ def FilterList(inputList, searchString, regex=r'[\s\S]*'):
     >>> FilterList(l, 'x*')
     ['xflurb']
     '''
+    wc = __WildcardPattern(searchString, regex)
+
+    # An index narrows the candidates by the literal start and end of the
+    # search string, then the regular expression checks only those
+    if isinstance(inputList, dict) and 'prefix_keys' in inputList:
+        prefix, suffix = __LiteralEnds(searchString)
+        candidates = np.arange(len(inputList['items']))
+        if prefix:
+            candidates = __IndexRange(inputList['prefix_keys'],
+                                      inputList['prefix_order'], prefix)
+        if suffix:
+            candidates = np.intersect1d(candidates,
+                                        __IndexRange(inputList['suffix_keys'],
+                                                     inputList['suffix_order'],
+                                                     suffix[::-1]))
+        candidates = np.sort(candidates)
+        lower = inputList['lower']
+        return [inputList['items'][i] for i in candidates if wc.match(lower[i])]
+
+    # Series and arrays are matched with vectorized string methods, ignoring
+    # capitalization; items that aren't strings don't match
+    if isinstance(inputList, (pd.Series, np.ndarray)):
+        series = pd.Series(inputList, dtype=object)
+        mask = series.str.lower().str.match(wc.pattern, na=False).values
+        return inputList[mask]
+
+    # Lists are matched with the compiled expression, ignoring capitalization
+    return [i for i in inputList if isinstance(i, str) and wc.match(i.lower())]
+
+
+# Pattern of GAP species codes (e.g., 'bBAEAx') and model codes (e.g.,
+# 'mSEWEx-y1'), in any capitalization
+__gapCodePattern = (r'^(?P<taxon>[abmrABMR])(?P<stem>[A-Za-z]{4})'
+                    r'(?P<subspecies>[A-Za-z])'
+                    r'(?:-(?P<season>[swySWY])(?P<intRegionCode>[1-6]))?$')
+
+
+def ParseGapCodes(codes, errors='coerce'):
+    '''
+    (list/Series) -> DataFrame
 
-    # Convert the search string into a regular expression, beginning it with a
-    # string begin character, replacing asterisks with the code to search for
-    # any number of characters and ending with a string end character.
-    wc = '^' + searchString.replace('*', regex) + '$'
-
-    # Initialize an empty list to store the results
-    newList = []
+    Parses and validates GAP species codes (six characters, e.g., 'bBAEAx')
+        and model codes (nine characters, e.g., 'mSEWEx-y1') with vectorized
+        string methods, so large frames of codes can be normalized without
+        looping over them.
 
-    # For each item in the input list
-    for i in inputList:
-        # If the item is a valid string
-        if isinstance(i, basestring):
-            # Ignore capitalization
-            iTemp = i.lower()
-            # If the string matches the search string
-            if re.match(wc, iTemp):
-                # Add the string to the output list
-                newList.append(i)
+    Arguments:
+    codes -- A list, numpy array, or pandas Series of species and/or model
+        codes, in any capitalization.
+    errors -- 'coerce' (the default) to return missing values for invalid
+        codes, or 'raise' to raise a ValueError listing them.
+
+    Returns a DataFrame with the same index as the codes (if a Series) and
+        columns:
+        strUC -- The species code in the Gap Code capitalization (see GapCase).
+        strSpeciesModelCode -- The model code, for model codes.
+        valid -- Whether the code is a valid species or model code.
+        taxon -- The class (e.g., 'Birds'; see dictionaries.taxaDict).
+        stem -- The genus/species stem (e.g., 'BAEA').
+        subspecies -- Whether the code is for a subspecies (does not end in 'x').
+        season -- The model's season ('s', 'w', or 'y').
+        intRegionCode -- The model's region number.
+        region -- The model's region name (see
+            dictionaries.regionsDict_Num_To_Name).
 
-    # Return the new list
-    return newList
+    Example:
+    >>> ParseGapCodes(['BBAEAX', 'mSEWEx-y1', 'xyz'])
+         strUC strSpeciesModelCode  valid    taxon  stem  subspecies season intRegionCode     region
+    0  bBAEAx                <NA>   True    Birds  BAEA       False    NaN           NaN        NaN
+    1  mSEWEx           mSEWEx-y1   True  Mammals  SEWE       False      y             1  Northwest
+    2    <NA>                <NA>  False      NaN  <NA>        <NA>    NaN           NaN        NaN
+    '''
+    codes = pd.Series(codes, dtype='string')
+    parts = codes.str.strip().str.extract(__gapCodePattern)
+
+    invalid = parts['taxon'].isna()
+    if errors == 'raise' and invalid.any():
+        raise ValueError('Invalid GAP species or model codes: '
+                         + ', '.join(codes[invalid].astype(str)))
+
+    # Normalize the capitalization
+    taxon = parts['taxon'].str.lower()
+    stem = parts['stem'].str.upper()
+    subspecies = parts['subspecies'].str.lower()
+    season = parts['season'].str.lower()
+    strUC = taxon + stem + subspecies
+
+    regions = dictionaries.regionsDict_Num_To_Name
+    intRegionCode = pd.to_numeric(parts['intRegionCode']).astype('Int64')
+
+    return pd.DataFrame({
+        'strUC': strUC,
+        'strSpeciesModelCode': strUC + '-' + season + parts['intRegionCode'],
+        'valid': ~invalid,
+        'taxon': pd.Categorical(taxon.map(dictionaries.taxaDict),
+                                categories=list(dictionaries.taxaDict.values())),
+        'stem': stem,
+        'subspecies': (subspecies != 'x').astype('boolean'),
+        'season': pd.Categorical(season, categories=['s', 'w', 'y']),
+        'intRegionCode': pd.Categorical(intRegionCode, categories=list(regions)),
+        'region': pd.Categorical(intRegionCode.map(regions),
+                                 categories=list(regions.values()))},
+        index=codes.index)
 
 
 def __FlattenGenerator(iterable):
@@ -150,7 +326,7 @@ def __FlattenGenerator(iterable):
     # For each item in the passed iterable
     for item in iterable:
         # If the item is iterable and is not a string
-        if isinstance(item, collections.Iterable) and not isinstance(item, basestring):
+        if isinstance(item, collections.abc.Iterable) and not isinstance(item, str):
             # Recursively call this function to return sub-subitems
             for sub in __FlattenGenerator(item):
                 yield sub
@@ -178,7 +354,7 @@ def Flatten(iterable):
     ['test', 'test2', 'test3', 1, 3, 'x', 'z']
     '''
 
-    if isinstance(iterable, collections.Iterable) and not isinstance(iterable, basestring):
+    if isinstance(iterable, collections.abc.Iterable) and not isinstance(iterable, str):
         outList = list(__FlattenGenerator(iterable))
     else:
         outList = [iterable]
@@ -3,6 +3,20 @@ This module facilitates common tasks for querying the GAP species taxonomies.
 """
 from gapproduction import database
 
+# Keys of the taxon information dictionaries and the tblTaxa columns they
+# come from
+__taxonFields = {'GAP_SppCode': 'strUC', 'GAP_ComName': 'strComName',
+                 'GAP_SciName': 'strSciName', 
+                 'ITIS_TSN': 'intITIScode', 'ITIS_SciName': 'strITIS_SciName',
+                 'ITIS_ComName': 'strITIS_ComName',
+                 'GAP_ITIS_Match': 'strGapITISmatch',
+                 'NatureServe_GlobalID': 'intNSglobal', 
+                 'NatureServe_SciName': 'strNS_SciName',
+                 'NatureServe_ComName': 'strNS_ComName',
+                 'GAP_NatureServe_Match': 'strGapNSmatch',
+                 'GBIF_Key': 'intGBIFkey', 'GBIF_SciName': 'strGBIF_SciName',
+                 'GAP_GBIF_Match': 'strGapGBIFmatch'}
+
 # Get a complete list of valid species codes.
 def AllSpeciesList(db : str = "GAPVert_48_2016") -> list:
     '''
@@ -87,33 +101,53 @@ def GetTaxonInfo(db : str, species_code : str = None,
             df = pd.read_sql(sql, connection, params=[common_name])
             connection.close()
 
-        taxon_dict = {}
-        taxon_dict['GAP_SppCode'] = df.loc[0,'strUC']
-        taxon_dict['GAP_ComName'] = df.loc[0,'strComName']
-        taxon_dict['GAP_SciName'] = df.loc[0,'strSciName']
-        
-        taxon_dict['ITIS_TSN'] = df.loc[0,'intITIScode']
-        taxon_dict['ITIS_SciName'] = df.loc[0,'strITIS_SciName']
-        taxon_dict['ITIS_ComName'] = df.loc[0,'strITIS_ComName']
+        taxon_dict = {k: df.loc[0, v] for k, v in __taxonFields.items()}
+        taxon_dict['database'] = db
 
-        taxon_dict['GAP_ITIS_Match'] = df.loc[0,'strGapITISmatch']
+        return taxon_dict
 
-        taxon_dict['NatureServe_GlobalID'] = df.loc[0,'intNSglobal']
-        taxon_dict['NatureServe_SciName'] = df.loc[0,'strNS_SciName']
-        taxon_dict['NatureServe_ComName'] = df.loc[0,'strNS_ComName']
+    except Exception as e:
+        print(e)
 
-        taxon_dict['GAP_NatureServe_Match'] = df.loc[0,'strGapNSmatch']
 
-        taxon_dict['GBIF_Key'] = df.loc[0,'intGBIFkey']
-        taxon_dict['GBIF_SciName'] = df.loc[0,'strGBIF_SciName']
-        taxon_dict['GAP_GBIF_Match'] = df.loc[0,'strGapGBIFmatch']
+# Get taxonomic information for many species at once
+def GetTaxonInfoBatch(db : str, species_codes = "all") -> dict:
+    '''
+    Returns the taxonomic information dictionaries (see GetTaxonInfo) for
+    many species, read from tblTaxa with one query.
 
-        taxon_dict['database'] = db
+    Parameters
+    ----------
+    db -- the name of the GAP database to query.
+    species_codes -- a list of species' unique GAP IDs, or "all".
 
-        return taxon_dict
+    Returns
+    -------
+    taxa -- a dictionary with species codes as keys and dictionaries of the
+        species' taxonomic information as values.
+    '''
+    import pandas as pd
+    from gapproduction import strings
 
-    except Exception as e:
-        print(e)
+    # Connect to GAP database
+    cursor, connection = database.ConnectDB(db)
+
+    columns = ", ".join(__taxonFields.values())
+    sql = f"""SELECT {columns} FROM dbo.tblTaxa"""
+    if isinstance(species_codes, str) and species_codes == "all":
+        df = pd.read_sql(sql, connection)
+    else:
+        species_codes = [strings.GapCase(x) for x in species_codes]
+        df = database.ReadSQLIn(sql + " WHERE strUC IN ({markers})",
+                                species_codes, connection)
+    cursor.close()
+    connection.close()
+
+    df = df.rename(columns={v: k for k, v in __taxonFields.items()})
+    df['database'] = db
+    df = df.astype(object).where(df.notna(), None)
+
+    return {x['GAP_SppCode']: x for x in df.to_dict('records')}
 
 
 # -----------------------------------------------------------------------------